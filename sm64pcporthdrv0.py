@@ -1,20 +1,51 @@
 
 
-import pygame
+import os
 import sys
 import math
 import random
+import time
+import json
+import collections
+import hashlib
+import inspect
+import mmap
+import struct
+import concurrent.futures
+import operator
+import itertools
+
+_IMPORT_T0 = time.perf_counter()
+
+import pygame
+import numpy as np
 
 # -------------------------------------------------
 # INIT
 # -------------------------------------------------
-pygame.init()
+# Importing this module touches neither SDL nor the font list; the window
+# is opened by init_display() and fonts resolve on first use (see fonts).
 WIDTH, HEIGHT = 800, 600
 SCREEN_CENTER = (WIDTH // 2, HEIGHT // 2)
-FPS = 60
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Ultra Mario 3D Bros - Complete Edition (SM64)")
-clock = pygame.time.Clock()
+FPS = 60                  # menu frame rate and simulation tick rate
+SIM_STEP_MS = 1000.0 / FPS
+MAX_RENDER_FPS = 240      # in-course frame cap; simulation stays at FPS
+MAX_FRAME_MS = 250        # longest frame the simulation will catch up on
+IDLE_FPS = 20             # loop rate while a static menu screen has nothing to redraw
+TITLE_IDLE_MS = 30000     # title screen animates at IDLE_FPS after this long without input
+
+def init_display(headless=False):
+    """Initialise pygame and open the game window; returns the screen surface.
+
+    headless selects SDL's dummy drivers, for benchmarks and tools.
+    """
+    if headless:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Ultra Mario 3D Bros - Complete Edition (SM64)")
+    return screen
 
 # -------------------------------------------------
 # COLORS
@@ -78,23 +109,153 @@ SKY_DESERT     = (220, 180, 120)
 SKY_MANSION    = (30, 20, 40)
 STAR_YELLOW    = (255, 255, 100)
 
-# Fonts
-try:
-    title_font   = pygame.font.SysFont("Arial Black", 55, bold=True)
-    letter_font  = pygame.font.SysFont("Georgia", 30, italic=True)
-    menu_font    = pygame.font.SysFont("Arial", 28, bold=True)
-    hud_font     = pygame.font.SysFont("Courier New", 18, bold=True)
-    select_font  = pygame.font.SysFont("Arial", 22, bold=True)
-    star_font    = pygame.font.SysFont("Arial Black", 36, bold=True)
-    small_font   = pygame.font.SysFont("Arial", 16)
-except Exception:
-    title_font   = pygame.font.Font(None, 70)
-    letter_font  = pygame.font.Font(None, 36)
-    menu_font    = pygame.font.Font(None, 40)
-    hud_font     = pygame.font.Font(None, 22)
-    select_font  = pygame.font.Font(None, 28)
-    star_font    = pygame.font.Font(None, 44)
-    small_font   = pygame.font.Font(None, 20)
+# Fonts: system name, size, bold, italic, and the size for the Font(None) fallback
+FONT_SPECS = {
+    "title":  ("Arial Black", 55, True,  False, 70),
+    "letter": ("Georgia",     30, False, True,  36),
+    "menu":   ("Arial",       28, True,  False, 40),
+    "hud":    ("Courier New", 18, True,  False, 22),
+    "select": ("Arial",       22, True,  False, 28),
+    "star":   ("Arial Black", 36, True,  False, 44),
+    "small":  ("Arial",       16, False, False, 20),
+}
+
+def user_cache_dir():
+    """Per-user directory for caches that survive between launches."""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "ultramario3d")
+
+def font_dirs():
+    """Directories the platform's system font scan reads from."""
+    home = os.path.expanduser("~")
+    if sys.platform == "win32":
+        return [os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts"),
+                os.path.join(os.environ.get("LOCALAPPDATA", home), "Microsoft", "Windows", "Fonts")]
+    if sys.platform == "darwin":
+        return ["/Library/Fonts", "/System/Library/Fonts", "/Network/Library/Fonts",
+                os.path.join(home, "Library", "Fonts")]
+    return ["/usr/share/fonts", "/usr/local/share/fonts", "/usr/X11R6/lib/X11/fonts",
+            os.path.join(home, ".fonts"), os.path.join(home, ".local", "share", "fonts")]
+
+def font_dirs_fingerprint():
+    """Modification times of the font directories and their direct subdirectories.
+
+    Installing or removing a font touches one of them, which invalidates
+    the resolved-font cache.
+    """
+    stamps = []
+    for root in font_dirs():
+        try:
+            stamps.append((root, os.stat(root).st_mtime_ns))
+            with os.scandir(root) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        stamps.append((entry.path, entry.stat().st_mtime_ns))
+        except OSError:
+            continue
+    return sorted(stamps)
+
+class FontCache:
+    """On-disk record of what SysFont resolved each (name, bold, italic) to.
+
+    An entry is the font file (None for pygame's default font) plus the
+    synthetic bold/italic flags SysFont applied, so a hit rebuilds the
+    exact same Font without scanning the system font list.
+    """
+    VERSION = 1
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = None
+        self.fingerprint = None
+
+    def _load(self):
+        self.fingerprint = [list(stamp) for stamp in font_dirs_fingerprint()]
+        self.entries = {}
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == self.VERSION and data.get("fingerprint") == self.fingerprint:
+            self.entries = data.get("fonts", {})
+
+    def _save(self):
+        data = {"version": self.VERSION, "fingerprint": self.fingerprint, "fonts": self.entries}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def font(self, name, size, bold, italic):
+        if self.entries is None:
+            self._load()
+        key = f"{name}|{int(bold)}|{int(italic)}"
+        hit = self.entries.get(key)
+        if hit is not None:
+            path, set_bold, set_italic = hit
+            try:
+                return self._construct(path, size, set_bold, set_italic)
+            except (OSError, RuntimeError):
+                pass   # file moved since it was cached; resolve afresh
+        resolved = []
+        def record(path, size, set_bold, set_italic):
+            resolved.append([path, set_bold, set_italic])
+            return self._construct(path, size, set_bold, set_italic)
+        font = pygame.font.SysFont(name, size, bold=bold, italic=italic, constructor=record)
+        self.entries[key] = resolved[0]
+        self._save()
+        return font
+
+    @staticmethod
+    def _construct(path, size, set_bold, set_italic):
+        font = pygame.font.Font(path, size)
+        font.set_bold(set_bold)
+        font.set_italic(set_italic)
+        return font
+
+class FontRegistry:
+    """Fonts from FONT_SPECS, each resolved the first time it is used.
+
+    SysFont scans the system font list, so faces are only looked up once a
+    screen actually draws with them, and resolutions go through a FontCache
+    so later launches skip the scan entirely.
+    """
+    def __init__(self, specs, cache=None):
+        self.specs = specs
+        self.cache = cache
+
+    def __getattr__(self, name):
+        if name not in self.specs:
+            raise AttributeError(name)
+        font = self.load(name)
+        setattr(self, name, font)
+        return font
+
+    def load(self, name):
+        if not pygame.font.get_init():
+            pygame.font.init()
+        sys_name, size, bold, italic, fallback_size = self.specs[name]
+        try:
+            if self.cache is not None:
+                return self.cache.font(sys_name, size, bold, italic)
+            return pygame.font.SysFont(sys_name, size, bold=bold, italic=italic)
+        except Exception:
+            return pygame.font.Font(None, fallback_size)
+
+    def loaded(self):
+        return [name for name in self.specs if name in self.__dict__]
+
+fonts = FontRegistry(FONT_SPECS, FontCache(os.path.join(user_cache_dir(), "fonts.json")))
 
 # Game States
 STATE_MENU       = 0
@@ -112,23 +273,166 @@ def rotate_y(x, z, angle):
     sin_a = math.sin(angle)
     return x * cos_a - z * sin_a, x * sin_a + z * cos_a
 
-def project_point(x, y, z, cam_x, cam_y, cam_z, cam_yaw, fov=700):
+NEAR_Z = 10
+FOCAL_LENGTH = 700     # screen pixels per unit of rx / rz
+
+def project_point(x, y, z, cam_x, cam_y, cam_z, cam_yaw, fov=FOCAL_LENGTH):
     dx = x - cam_x
     dy = y - cam_y
     dz = z - cam_z
     rx, rz = rotate_y(dx, dz, -cam_yaw)
     ry = dy
-    if rz <= 10:
+    if rz <= NEAR_Z:
         return None
     scale = fov / rz
     px = rx * scale + SCREEN_CENTER[0]
     py = -ry * scale + SCREEN_CENTER[1]
     return (int(px), int(py), rz)
 
+def camera_space(verts, cam_x, cam_y, cam_z, cam_yaw):
+    """Rotate an (N, 3) array of world positions into camera space (rx, ry, rz)."""
+    cos_a = math.cos(-cam_yaw)
+    sin_a = math.sin(-cam_yaw)
+    dx = verts[:, 0] - cam_x
+    dy = verts[:, 1] - cam_y
+    dz = verts[:, 2] - cam_z
+    return dx * cos_a - dz * sin_a, dy, dx * sin_a + dz * cos_a
+
+def project_vertices(verts, cam_x, cam_y, cam_z, cam_yaw, fov=FOCAL_LENGTH):
+    """Batched project_point over an (N, 3) array of world positions.
+
+    Returns (sx, sy, rz) arrays: integer screen coordinates and camera depth.
+    Vertices with rz <= NEAR_Z are behind the near plane; their screen
+    coordinates are garbage and must not be used.
+    """
+    rx, ry, rz = camera_space(verts, cam_x, cam_y, cam_z, cam_yaw)
+    scale = fov / np.maximum(rz, NEAR_Z)
+    sx = (rx * scale + SCREEN_CENTER[0]).astype(np.int64)
+    sy = (-ry * scale + SCREEN_CENTER[1]).astype(np.int64)
+    return sx, sy, rz
+
+def clip_near(poly, fov=FOCAL_LENGTH):
+    """Clip a camera-space polygon against the near plane and project it.
+
+    Sutherland-Hodgman against rz = NEAR_Z. Returns (pts, mean depth, corner
+    depths), or None when nothing of the polygon is left in front of the
+    camera.
+    """
+    out = []
+    prev = poly[-1]
+    prev_in = prev[2] > NEAR_Z
+    for cur in poly:
+        cur_in = cur[2] > NEAR_Z
+        if cur_in != prev_in:
+            t = (NEAR_Z - prev[2]) / (cur[2] - prev[2])
+            out.append((prev[0] + (cur[0] - prev[0]) * t,
+                        prev[1] + (cur[1] - prev[1]) * t, NEAR_Z))
+        if cur_in:
+            out.append(cur)
+        prev, prev_in = cur, cur_in
+    if len(out) < 3:
+        return None
+    pts = []
+    zs = []
+    for rx, ry, rz in out:
+        scale = fov / rz
+        pts.append((int(rx * scale + SCREEN_CENTER[0]), int(-ry * scale + SCREEN_CENTER[1])))
+        zs.append(rz)
+    return pts, sum(zs) / len(out), zs
+
+def on_screen(pts):
+    xs = [p[0] for p in pts]
+    ys = [p[1] for p in pts]
+    return max(xs) >= 0 and min(xs) < WIDTH and max(ys) >= 0 and min(ys) < HEIGHT
+
 def lerp_color(c1, c2, t):
     t = max(0.0, min(1.0, t))
     return tuple(int(c1[i] + (c2[i] - c1[i]) * t) for i in range(3))
 
+# -------------------------------------------------
+# INPUT
+# -------------------------------------------------
+# One tick of player input is a bitmask of these flags
+IN_LEFT      = 1 << 0
+IN_RIGHT     = 1 << 1
+IN_UP        = 1 << 2
+IN_DOWN      = 1 << 3
+IN_JUMP      = 1 << 4
+IN_CAM_LEFT  = 1 << 5
+IN_CAM_RIGHT = 1 << 6
+
+INPUT_KEYS = [
+    (IN_LEFT,      (pygame.K_LEFT, pygame.K_a)),
+    (IN_RIGHT,     (pygame.K_RIGHT, pygame.K_d)),
+    (IN_UP,        (pygame.K_UP, pygame.K_w)),
+    (IN_DOWN,      (pygame.K_DOWN, pygame.K_s)),
+    (IN_JUMP,      (pygame.K_SPACE,)),
+    (IN_CAM_LEFT,  (pygame.K_q,)),
+    (IN_CAM_RIGHT, (pygame.K_e,)),
+]
+
+def read_input(keys):
+    """Fold a pygame.key.get_pressed() snapshot into an input bitmask."""
+    inp = 0
+    for flag, codes in INPUT_KEYS:
+        for code in codes:
+            if keys[code]:
+                inp |= flag
+                break
+    return inp
+
+# File: magic, course index, star count, one collected flag per star at the
+# start (a cached course keeps its stars), then one input byte per tick
+INPUT_MAGIC = b"UM3DINP2"
+
+class InputRecorder:
+    """Records one input byte per simulation tick for a single course."""
+    def __init__(self, course_index, collected_stars=b""):
+        self.course_index = course_index
+        self.collected_stars = bytes(collected_stars)
+        self.ticks = bytearray()
+
+    def record(self, inp):
+        self.ticks.append(inp)
+        return inp
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(INPUT_MAGIC + bytes([self.course_index, len(self.collected_stars)]) +
+                    self.collected_stars + self.ticks)
+
+class InputReplay:
+    """A recording made by InputRecorder: the course, which of its stars
+    were already collected, and the per-tick inputs."""
+    def __init__(self, course_index, ticks, collected_stars=b""):
+        self.course_index = course_index
+        self.collected_stars = bytes(collected_stars)
+        self.ticks = bytes(ticks)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        head = len(INPUT_MAGIC) + 2
+        if not data.startswith(INPUT_MAGIC) or len(data) < head or len(data) < head + data[head - 1]:
+            raise ValueError(f"{path}: not an input recording")
+        stars_end = head + data[head - 1]
+        return cls(data[head - 2], data[stars_end:], data[head:stars_end])
+
+def scripted_inputs(ticks, seed=0):
+    """Deterministic pseudo-random play: held directions, hops and camera turns."""
+    rng = random.Random(seed)
+    out = bytearray()
+    moves = [0, IN_UP, IN_UP | IN_LEFT, IN_UP | IN_RIGHT, IN_LEFT, IN_RIGHT, IN_DOWN]
+    while len(out) < ticks:
+        held = rng.choice(moves)
+        if rng.random() < 0.2:
+            held |= rng.choice((IN_CAM_LEFT, IN_CAM_RIGHT))
+        for i in range(rng.randint(20, 90)):
+            out.append(held | (IN_JUMP if rng.random() < 0.03 else 0))
+    return bytes(out[:ticks])
+
+
 # -------------------------------------------------
 # MARIO
 # -------------------------------------------------
@@ -151,18 +455,32 @@ class Mario:
         self.lives           = 4
         self.floor_y         = 0.0
 
+        self.prev_pos        = (self.x, self.y, self.z)
+
     def respawn(self, x, z):
         self.x, self.y, self.z = x, 0.0, z
         self.vx = self.vy = self.vz = 0.0
         self.grounded = True
         self.floor_y = 0.0
+        self.prev_pos = (self.x, self.y, self.z)
 
-    def update(self, keys, cam_yaw, platforms=None):
+    def store_prev(self):
+        """Remember the pre-tick position for render interpolation."""
+        self.prev_pos = (self.x, self.y, self.z)
+
+    def pos(self, alpha=1.0):
+        """Position blended from the previous tick's (alpha=0) to the current."""
+        px, py, pz = self.prev_pos
+        return (px + (self.x - px) * alpha,
+                py + (self.y - py) * alpha,
+                pz + (self.z - pz) * alpha)
+
+    def update(self, inp, cam_yaw, platforms=None):
         move_x = move_z = 0
-        if keys[pygame.K_LEFT]  or keys[pygame.K_a]: move_x -= 1
-        if keys[pygame.K_RIGHT] or keys[pygame.K_d]: move_x += 1
-        if keys[pygame.K_UP]    or keys[pygame.K_w]: move_z += 1
-        if keys[pygame.K_DOWN]  or keys[pygame.K_s]: move_z -= 1
+        if inp & IN_LEFT:  move_x -= 1
+        if inp & IN_RIGHT: move_x += 1
+        if inp & IN_UP:    move_z += 1
+        if inp & IN_DOWN:  move_z -= 1
 
         if move_x or move_z:
             input_angle  = math.atan2(move_x, move_z)
@@ -194,7 +512,7 @@ class Mario:
         # Platform collision
         self.floor_y = 0.0
         if platforms:
-            for px, py, pz, pw, ph, pd in platforms:
+            for px, py, pz, pw, ph, pd in platforms.query(self.x, self.z):
                 hx, hz = pw / 2, pd / 2
                 if (px - hx <= self.x <= px + hx and
                     pz - hz <= self.z <= pz + hz):
@@ -210,7 +528,7 @@ class Mario:
         else:
             self.grounded = False
 
-        if keys[pygame.K_SPACE] and self.grounded:
+        if inp & IN_JUMP and self.grounded:
             self.vy = self.jump_force
             self.grounded = False
 
@@ -220,18 +538,19 @@ class Mario:
             return "death"
         return None
 
-    def get_mesh(self):
+    def get_mesh(self, alpha=1.0):
         s = self.size
         h = s * 2
+        x, y, z = self.pos(alpha)
         verts = [
-            (self.x - s, self.y,     self.z - s),
-            (self.x + s, self.y,     self.z - s),
-            (self.x + s, self.y,     self.z + s),
-            (self.x - s, self.y,     self.z + s),
-            (self.x - s, self.y + h, self.z - s),
-            (self.x + s, self.y + h, self.z - s),
-            (self.x + s, self.y + h, self.z + s),
-            (self.x - s, self.y + h, self.z + s),
+            (x - s, y,     z - s),
+            (x + s, y,     z - s),
+            (x + s, y,     z + s),
+            (x - s, y,     z + s),
+            (x - s, y + h, z - s),
+            (x + s, y + h, z - s),
+            (x + s, y + h, z + s),
+            (x - s, y + h, z + s),
         ]
         faces = [
             ([0,1,2,3], MARIO_BLUE),
@@ -246,6 +565,8 @@ class Mario:
 # -------------------------------------------------
 # CAMERA
 # -------------------------------------------------
+CameraPose = collections.namedtuple("CameraPose", "x y z yaw")
+
 class Camera:
     def __init__(self, target):
         self.target = target
@@ -253,10 +574,24 @@ class Camera:
         self.dist   = 700.0
         self.height = 350.0
         self.x = self.y = self.z = 0.0
-
-    def update(self, keys):
-        if keys[pygame.K_q]: self.yaw -= 0.04
-        if keys[pygame.K_e]: self.yaw += 0.04
+        self.prev_pose = None
+
+    def store_prev(self):
+        self.prev_pose = (self.x, self.y, self.z, self.yaw)
+
+    def pose(self, alpha=1.0):
+        """CameraPose blended from the previous tick's (alpha=0) to the current."""
+        if self.prev_pose is None or alpha >= 1.0:
+            return CameraPose(self.x, self.y, self.z, self.yaw)
+        px, py, pz, pyaw = self.prev_pose
+        return CameraPose(px + (self.x - px) * alpha,
+                          py + (self.y - py) * alpha,
+                          pz + (self.z - pz) * alpha,
+                          pyaw + (self.yaw - pyaw) * alpha)
+
+    def update(self, inp):
+        if inp & IN_CAM_LEFT:  self.yaw -= 0.04
+        if inp & IN_CAM_RIGHT: self.yaw += 0.04
         tx = self.target.x - math.sin(self.yaw) * self.dist
         tz = self.target.z - math.cos(self.yaw) * self.dist
         ty = self.target.y + self.height
@@ -267,7 +602,47 @@ class Camera:
 # -------------------------------------------------
 # COLLECTIBLES
 # -------------------------------------------------
+class InstanceTemplate:
+    """One mesh shared by every instance of a collectible type.
+
+    verts are relative to the instance's anchor; every face has the same
+    number of corners. place() puts all live instances into one vertex
+    array with a single broadcast, and corners() lists their faces as
+    one index array, so no per-instance lists are built.
+    """
+    def __init__(self, verts, faces):
+        self.verts = np.array(verts, dtype=np.float64)
+        self.face_corners = np.array([indices for indices, _ in faces], dtype=np.int64)
+        self.colors = [color for _, color in faces]
+        self.center = self.verts.mean(axis=0)
+        self.face_count = len(faces)
+
+    def place(self, offset, scale=None):
+        """(n * V, 3) vertices: the template scaled per axis by scale (n, 3)
+        and moved to offset (n, 3)."""
+        verts = self.verts[None, :, :]
+        if scale is not None:
+            verts = verts * scale[:, None, :]
+        return (verts + offset[:, None, :]).reshape(-1, 3)
+
+    def corners(self, n):
+        """(n * F, k) vertex ids of n placed instances' faces."""
+        shift = np.arange(n) * len(self.verts)
+        return (self.face_corners[None, :, :] + shift[:, None, None]).reshape(-1, self.face_corners.shape[1])
+
+def instance_columns(items, *names):
+    """(n, len(names)) float array of the named attributes of items."""
+    values = itertools.chain.from_iterable(map(operator.attrgetter(*names), items))
+    return np.fromiter(values, dtype=np.float64, count=len(items) * len(names)).reshape(-1, len(names))
+
 class Star:
+    TEMPLATE = InstanceTemplate(
+        [(0, 30, 0), (-15, 7.5, -15), (15, 7.5, -15), (15, 7.5, 15), (-15, 7.5, 15), (0, -15, 0)],
+        [([0,1,2], STAR_YELLOW), ([0,2,3], STAR_YELLOW),
+         ([0,3,4], STAR_YELLOW), ([0,4,1], STAR_YELLOW),
+         ([5,2,1], GOLD),        ([5,3,2], GOLD),
+         ([5,4,3], GOLD),        ([5,1,4], GOLD)])
+
     def __init__(self, x, y, z):
         self.x, self.y, self.z = x, y, z
         self.collected = False
@@ -282,35 +657,25 @@ class Star:
         dx = mario.x - self.x
         dy = mario.y - (self.y + math.sin(self.bob) * 10)
         dz = mario.z - self.z
-        if math.sqrt(dx*dx + dy*dy + dz*dz) < 60:
+        if dx*dx + dy*dy + dz*dz < 60 * 60:
             self.collected = True
             mario.stars_collected += 1
             return True
         return False
 
-    def get_mesh(self):
-        if self.collected:
-            return [], []
-        y_off = math.sin(self.bob) * 10
-        s = 15
-        cy = self.y + y_off
-        verts = [
-            (self.x, cy + s*2, self.z),
-            (self.x - s, cy + s*0.5, self.z - s),
-            (self.x + s, cy + s*0.5, self.z - s),
-            (self.x + s, cy + s*0.5, self.z + s),
-            (self.x - s, cy + s*0.5, self.z + s),
-            (self.x, cy - s, self.z),
-        ]
-        faces = [
-            ([0,1,2], STAR_YELLOW), ([0,2,3], STAR_YELLOW),
-            ([0,3,4], STAR_YELLOW), ([0,4,1], STAR_YELLOW),
-            ([5,2,1], GOLD),        ([5,3,2], GOLD),
-            ([5,4,3], GOLD),        ([5,1,4], GOLD),
-        ]
-        return verts, faces
+    @classmethod
+    def batch_verts(cls, stars):
+        """Vertices of the given stars, bobbing, as one (n * 6, 3) array."""
+        offset = instance_columns(stars, "x", "y", "z", "bob")
+        offset[:, 1] += np.sin(offset[:, 3]) * 10
+        return cls.TEMPLATE.place(offset[:, :3])
 
 class Coin:
+    # Unit half-width; each coin scales x by its spin
+    TEMPLATE = InstanceTemplate(
+        [(-1, 0, 0), (1, 0, 0), (1, 16, 0), (-1, 16, 0)],
+        [([0,1,2,3], YELLOW)])
+
     def __init__(self, x, y, z):
         self.x, self.y, self.z = x, y, z
         self.collected = False
@@ -325,25 +690,729 @@ class Coin:
         dx = mario.x - self.x
         dy = mario.y - self.y
         dz = mario.z - self.z
-        if math.sqrt(dx*dx + dy*dy + dz*dz) < 45:
+        if dx*dx + dy*dy + dz*dz < 45 * 45:
             self.collected = True
             mario.coins += 1
             return True
         return False
 
-    def get_mesh(self):
-        if self.collected:
-            return [], []
-        s = 8
-        w = abs(math.cos(self.spin)) * s + 2
-        verts = [
-            (self.x - w, self.y,      self.z),
-            (self.x + w, self.y,      self.z),
-            (self.x + w, self.y + s*2, self.z),
-            (self.x - w, self.y + s*2, self.z),
-        ]
-        faces = [([0,1,2,3], YELLOW)]
-        return verts, faces
+    @classmethod
+    def batch_verts(cls, coins):
+        """Vertices of the given coins, spinning, as one (n * 4, 3) array."""
+        offset = instance_columns(coins, "x", "y", "z", "spin")
+        scale = np.ones((len(coins), 3))
+        scale[:, 0] = np.abs(np.cos(offset[:, 3])) * 8 + 2
+        return cls.TEMPLATE.place(offset[:, :3], scale)
+
+# -------------------------------------------------
+# COMPILED MESH
+# -------------------------------------------------
+class CompiledMesh:
+    """Packed, read-only course geometry produced by WorldBase.compile().
+
+    positions    (N, 3) float32 vertex positions
+    face_index   flat int32 buffer of every face's vertex ids
+    face_offsets (F + 1,) int32; face f uses face_index[off[f]:off[f + 1]]
+    face_color   (F,) uint16 ids into palette
+    palette      list of RGB tuples
+    face_object  (F,) int32 id of the builder call that made each face
+    normals      (F, 3) float32 unit normals, pointing out of their object
+    two_sided    (F,) bool, faces never back-face culled (open shapes)
+    centroids    (F, 3) float32 face centroids
+    """
+    # Constructor arrays, in order; everything else is derived from them
+    PACKED = ("positions", "face_index", "face_offsets", "face_color",
+              "face_object", "normals", "two_sided")
+
+    def __init__(self, positions, face_index, face_offsets, face_color, palette,
+                 face_object, normals, two_sided):
+        self.positions    = positions
+        self.face_index   = face_index
+        self.face_offsets = face_offsets
+        self.face_color   = face_color
+        self.palette      = palette
+        self.face_object  = face_object
+        self.normals      = normals
+        self.two_sided    = two_sided
+        self.face_sizes   = np.diff(face_offsets)
+        if len(face_index):
+            sums = np.add.reduceat(positions[face_index], face_offsets[:-1], axis=0)
+            self.centroids = (sums / self.face_sizes[:, None]).astype(np.float32)
+        else:
+            self.centroids = np.zeros((0, 3), dtype=np.float32)
+        for arr in self.arrays():
+            arr.flags.writeable = False
+        self._spheres = None
+        self._edges = None
+
+    def arrays(self):
+        return (self.positions, self.face_index, self.face_offsets, self.face_color,
+                self.face_object, self.normals, self.two_sided, self.face_sizes,
+                self.centroids)
+
+    @classmethod
+    def from_lists(cls, verts, faces, face_object, object_spans, two_sided):
+        palette = []
+        color_ids = {}
+        face_color = np.empty(len(faces), dtype=np.uint16)
+        face_offsets = np.zeros(len(faces) + 1, dtype=np.int32)
+        flat = []
+        for f, (indices, color) in enumerate(faces):
+            if color not in color_ids:
+                color_ids[color] = len(palette)
+                palette.append(color)
+            face_color[f] = color_ids[color]
+            flat += indices
+            face_offsets[f + 1] = len(flat)
+        positions = np.array(verts, dtype=np.float32).reshape(-1, 3)
+        face_index = np.array(flat, dtype=np.int32)
+        face_object = np.array(face_object, dtype=np.int32)
+        normals = face_normals(positions, face_index, face_offsets)
+        if len(faces):
+            # Orient every normal away from the centre of the object it belongs
+            # to; builder windings are not consistent, object shapes are convex.
+            centers = np.array([positions[a:b].mean(axis=0) for a, b in object_spans],
+                               dtype=np.float32).reshape(-1, 3)
+            starts = face_offsets[:-1]
+            centroids = np.add.reduceat(positions[face_index], starts, axis=0)
+            centroids /= np.diff(face_offsets)[:, None]
+            outward = np.einsum("ij,ij->i", normals, centroids - centers[face_object])
+            normals[outward < 0] *= -1
+        two_sided = np.array(two_sided, dtype=bool)
+        two_sided |= ~normals.any(axis=1)
+        return cls(positions, face_index, face_offsets, face_color, palette,
+                   face_object, normals, two_sided)
+
+    @property
+    def face_count(self):
+        return len(self.face_color)
+
+    @property
+    def spheres(self):
+        """ObjectSpheres over this mesh's builder objects; built on first use."""
+        if self._spheres is None:
+            self._spheres = ObjectSpheres(self)
+        return self._spheres
+
+    @property
+    def edges(self):
+        """MeshEdges of this mesh; built on first use."""
+        if self._edges is None:
+            self._edges = MeshEdges(self)
+        return self._edges
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self.arrays())
+
+
+def face_normals(positions, face_index, face_offsets):
+    """Unit face normals by Newell's method; zero rows for degenerate faces."""
+    if not len(face_index):
+        return np.zeros((0, 3), dtype=np.float32)
+    starts, ends = face_offsets[:-1], face_offsets[1:]
+    nxt = np.arange(1, len(face_index) + 1)
+    nxt[ends - 1] = starts
+    p = positions[face_index].astype(np.float64)
+    q = p[nxt]
+    n = np.add.reduceat(np.cross(p, q), starts, axis=0)
+    length = np.linalg.norm(n, axis=1)
+    n[length > 0] /= length[length > 0, None]
+    return n.astype(np.float32)
+
+class ObjectSpheres:
+    """Bounding spheres of the builder objects of a CompiledMesh.
+
+    Every object (one add_box, add_roof, ...) gets the sphere around its
+    bounding box. visible_faces() tests all of them against the view
+    frustum in one batch, so the faces of an object wholly outside it are
+    never transformed.
+    """
+
+    def __init__(self, mesh):
+        self.mesh = mesh
+        count = int(mesh.face_object.max()) + 1 if mesh.face_count else 0
+        corners = mesh.positions[mesh.face_index].astype(np.float64)
+        corner_object = np.repeat(mesh.face_object, mesh.face_sizes)
+        lo = np.full((count, 3), np.inf)
+        hi = np.full((count, 3), -np.inf)
+        np.minimum.at(lo, corner_object, corners)
+        np.maximum.at(hi, corner_object, corners)
+        self.object_count = count
+        self.objects = np.flatnonzero(np.isfinite(lo[:, 0]))
+        lo, hi = lo[self.objects], hi[self.objects]
+        self.centers = (lo + hi) / 2
+        self.radius = np.linalg.norm(hi - lo, axis=1) / 2
+
+    def visible_objects(self, cam):
+        """Bool mask over object ids: True where the object may be in view."""
+        visible = np.zeros(self.object_count, dtype=bool)
+        if not len(self.radius):
+            return visible
+        # Each sphere against the side planes |x| = kx z, |y| = ky z and
+        # the near plane
+        kx, ky = SCREEN_CENTER[0] / FOCAL_LENGTH, SCREEN_CENTER[1] / FOCAL_LENGTH
+        rx, ry, rz = camera_space(self.centers, cam.x, cam.y, cam.z, cam.yaw)
+        r = self.radius
+        side = np.maximum((np.abs(rx) - kx * rz) / math.hypot(1.0, kx),
+                          (np.abs(ry) - ky * rz) / math.hypot(1.0, ky))
+        visible[self.objects[(rz + r >= NEAR_Z) & (side <= r)]] = True
+        return visible
+
+    def visible_faces(self, cam):
+        """Ids of the mesh faces whose object passed visible_objects()."""
+        return np.flatnonzero(self.visible_objects(cam)[self.mesh.face_object])
+
+
+class MeshEdges:
+    """Unique edges of a CompiledMesh, for stroking each shared edge once.
+
+    Corners at the same position count as one vertex, so the seams of BSP
+    pieces and faces welded by the optimizer pair up. corner_edge[c] is the
+    edge from corner c to the next corner of its face. An edge is a crease
+    (worth a line) when it bounds one face only or its faces differ in
+    color or facing; edges inside a flat single-color surface are not.
+    """
+    def __init__(self, mesh):
+        starts, ends = mesh.face_offsets[:-1], mesh.face_offsets[1:]
+        nxt = np.arange(1, len(mesh.face_index) + 1)
+        nxt[ends - 1] = starts
+        grid = np.round(mesh.positions.astype(np.float64) / OPTIMIZE_TOLERANCE).astype(np.int64)
+        _, vertex = np.unique(grid, axis=0, return_inverse=True)
+        vertex = vertex.ravel()
+        a, b = vertex[mesh.face_index], vertex[mesh.face_index[nxt]]
+        pairs = np.stack((np.minimum(a, b), np.maximum(a, b)), axis=1)
+        _, first, corner_edge = np.unique(pairs, axis=0, return_index=True, return_inverse=True)
+        corner_edge = corner_edge.ravel()
+        corner_face = np.repeat(np.arange(mesh.face_count), mesh.face_sizes)
+        ref = corner_face[first][corner_edge]          # first face using each corner's edge
+        differs = ((mesh.face_color[corner_face] != mesh.face_color[ref]) |
+                   (np.einsum("ij,ij->i", mesh.normals[corner_face], mesh.normals[ref]) < 1 - 1e-4))
+        crease = np.bincount(corner_edge, weights=differs, minlength=len(first)) > 0
+        crease |= np.bincount(corner_edge, minlength=len(first)) == 1
+        self.count = len(first)
+        self.corner_edge = corner_edge
+        self.crease = crease
+
+# Mesh optimizer: positions closer than this are one vertex; hidden-face
+# probes step this far out of a face before testing for a solid box.
+OPTIMIZE_TOLERANCE = 1e-3
+HIDDEN_PROBE       = 0.05
+
+def optimize_mesh(mesh):
+    """Drop faces that can never be seen and merge the rest, once at build time.
+
+    1. hidden: one-sided faces whose outside, just past the face, lies
+       inside a solid box (an add_box object): bottoms resting on floors,
+       walls shared by abutting boxes, faces buried in overlapping boxes
+    2. weld: corners closer than OPTIMIZE_TOLERANCE become one vertex
+    3. coincident: of faces on the same corners facing the same way, one
+       is kept
+    4. merge: neighbouring coplanar faces of one color, side-ness and
+       facing that share an edge become one face when the union is convex
+
+    Returns the optimized CompiledMesh and a dict of face and vertex counts.
+    """
+    stats = {"faces_in": mesh.face_count, "verts_in": len(mesh.positions)}
+    offsets = mesh.face_offsets.tolist()
+    flat = mesh.face_index.tolist()
+    polys = [flat[offsets[f]:offsets[f + 1]] for f in range(mesh.face_count)]
+    normals = mesh.normals
+    keep = np.ones(mesh.face_count, dtype=bool)
+
+    # 1. Hidden faces, tested against every solid box but their own
+    axis_aligned = np.isclose(np.abs(normals).max(axis=1), 1.0, atol=1e-4)
+    objects = mesh.face_object
+    count = int(objects.max()) + 1 if mesh.face_count else 0
+    faces_of = np.bincount(objects, minlength=count)
+    aligned_of = np.bincount(objects, weights=axis_aligned & ~mesh.two_sided, minlength=count)
+    box_ids = np.flatnonzero((faces_of == 6) & (aligned_of == 6))
+    corners = mesh.positions[mesh.face_index].astype(np.float64)
+    corner_object = np.repeat(objects, mesh.face_sizes)
+    lo = np.full((count, 3), np.inf)
+    hi = np.full((count, 3), -np.inf)
+    np.minimum.at(lo, corner_object, corners)
+    np.maximum.at(hi, corner_object, corners)
+    box_lo = lo[box_ids] - OPTIMIZE_TOLERANCE
+    box_hi = hi[box_ids] + OPTIMIZE_TOLERANCE
+    for f in np.flatnonzero(~mesh.two_sided & normals.any(axis=1)).tolist():
+        pts = corners[offsets[f]:offsets[f + 1]] + normals[f] * HIDDEN_PROBE
+        inside = ((pts[None] >= box_lo[:, None]) & (pts[None] <= box_hi[:, None])).all(axis=(1, 2))
+        inside &= box_ids != objects[f]
+        if inside.any():
+            keep[f] = False
+    stats["hidden"] = int(np.count_nonzero(~keep))
+
+    # 2. Weld
+    grid = np.round(mesh.positions.astype(np.float64) / OPTIMIZE_TOLERANCE).astype(np.int64)
+    _, first, remap = np.unique(grid, axis=0, return_index=True, return_inverse=True)
+    remap = remap.ravel().tolist()
+    positions = mesh.positions[first]
+    for f, poly in enumerate(polys):
+        welded = []
+        for i in poly:
+            i = remap[i]
+            if not welded or welded[-1] != i:
+                welded.append(i)
+        if len(welded) > 1 and welded[0] == welded[-1]:
+            welded.pop()
+        polys[f] = welded
+        if len(welded) < 3:
+            keep[f] = False
+
+    # 3. Coincident faces
+    seen = {}
+    coincident = 0
+    for f in np.flatnonzero(keep).tolist():
+        key = (frozenset(polys[f]), tuple(np.round(normals[f], 3).tolist()))
+        if key in seen:
+            keep[f] = False
+            coincident += 1
+        else:
+            seen[key] = f
+    stats["coincident"] = coincident
+
+    # 4. Merge coplanar neighbours
+    pos = positions.astype(np.float64)
+    color, two_sided = mesh.face_color.tolist(), mesh.two_sided.tolist()
+    edges = {}
+    for f in np.flatnonzero(keep).tolist():
+        poly = polys[f]
+        for a, b in zip(poly, poly[1:] + poly[:1]):
+            edges.setdefault((min(a, b), max(a, b)), []).append(f)
+    merged = 0
+    changed = True
+    while changed:
+        changed = False
+        for edge, users in list(edges.items()):
+            users = [f for f in users if keep[f]]
+            edges[edge] = users
+            if len(users) != 2:
+                continue
+            f, g = users
+            if (color[f] != color[g] or two_sided[f] != two_sided[g]
+                    or float(normals[f] @ normals[g]) < 1 - 1e-5):
+                continue
+            poly = merge_polygons(polys[f], polys[g], edge, pos, normals[f])
+            if poly is None:
+                continue
+            polys[f] = poly
+            keep[g] = False
+            merged += 1
+            for a, b in zip(poly, poly[1:] + poly[:1]):
+                users_ab = edges.setdefault((min(a, b), max(a, b)), [])
+                if f not in users_ab:
+                    users_ab.append(f)
+            changed = True
+    stats["merged"] = merged
+
+    faces = np.flatnonzero(keep)
+    kept = [polys[f] for f in faces.tolist()]
+    face_offsets = np.zeros(len(kept) + 1, dtype=np.int32)
+    face_offsets[1:] = np.cumsum([len(p) for p in kept])
+    # Drop vertices no face uses any more
+    face_index = np.array([i for p in kept for i in p], dtype=np.int64)
+    used, face_index = np.unique(face_index, return_inverse=True)
+    stats["faces_out"] = len(kept)
+    stats["verts_out"] = len(used)
+    out = CompiledMesh(positions[used], face_index.astype(np.int32).ravel(), face_offsets,
+                       mesh.face_color[faces], mesh.palette, mesh.face_object[faces],
+                       mesh.normals[faces], mesh.two_sided[faces])
+    return out, stats
+
+
+def _edge_at(poly, a, b):
+    """Index of a in poly when a -> b is one of its edges, else None."""
+    if a in poly:
+        i = poly.index(a)
+        if poly[(i + 1) % len(poly)] == b:
+            return i
+    return None
+
+def merge_polygons(p, q, edge, pos, normal):
+    """Union of convex coplanar polygons p and q across a shared edge, or None.
+
+    Corners left collinear by the union are dropped. None when the edge is
+    not shared, the polygons are not coplanar or the union is not convex.
+    """
+    a, b = edge
+    i = _edge_at(p, a, b)
+    if i is None:
+        a, b = b, a
+        i = _edge_at(p, a, b)
+        if i is None:
+            return None
+    if _edge_at(q, b, a) is None:
+        if _edge_at(q, a, b) is None:
+            return None
+        q = q[::-1]
+    if abs(float(normal @ (pos[q].mean(axis=0) - pos[p[0]]))) > OPTIMIZE_TOLERANCE:
+        return None
+    # Around p from b to a, then around q from a back to b
+    j = q.index(a)
+    ring = p[i + 1:] + p[:i + 1] + (q[j:] + q[:j])[1:-1]
+    if len(set(ring)) != len(ring):
+        return None
+    pts = pos[ring]
+    prev, nxt = np.roll(pts, 1, axis=0), np.roll(pts, -1, axis=0)
+    turn = np.cross(pts - prev, nxt - pts) @ normal
+    scale = np.linalg.norm(pts - prev, axis=1) * np.linalg.norm(nxt - pts, axis=1)
+    bend = turn / np.maximum(scale, 1e-12)
+    straight = np.abs(bend) < 1e-6
+    if (bend[~straight] > 0).any() and (bend[~straight] < 0).any():
+        return None
+    ring = [v for v, s in zip(ring, straight.tolist()) if not s]
+    return ring if len(ring) >= 3 else None
+
+class CollectibleIndex:
+    """Spatial hash of uncollected Stars or Coins, bucketed on an XZ grid.
+
+    check() only tests the 3x3 block of cells around Mario, and collected
+    items leave their bucket, so pickup cost stays flat however many coins
+    a course places. The cell must be wider than the pickup radius plus the
+    star bob.
+    """
+    def __init__(self, items, cell=150.0):
+        self.cell = cell
+        self.buckets = {}
+        for item in items:
+            if not item.collected:
+                self.buckets.setdefault(self._key(item.x, item.z), []).append(item)
+
+    def __len__(self):
+        return sum(len(b) for b in self.buckets.values())
+
+    def _key(self, x, z):
+        return int(math.floor(x / self.cell)), int(math.floor(z / self.cell))
+
+    def check(self, mario):
+        """Run item.check on nearby items; return the ones just collected."""
+        got = []
+        kx, kz = self._key(mario.x, mario.z)
+        for cx in (kx - 1, kx, kx + 1):
+            for cz in (kz - 1, kz, kz + 1):
+                bucket = self.buckets.get((cx, cz))
+                if not bucket:
+                    continue
+                for item in bucket:
+                    if item.check(mario):
+                        got.append(item)
+                if got:
+                    bucket[:] = [item for item in bucket if not item.collected]
+        return got
+
+
+# -------------------------------------------------
+# COLLISION GRID
+# -------------------------------------------------
+class PlatformGrid:
+    """Uniform XZ grid over (x, y, z, w, h, d) collision boxes.
+
+    Each box is listed in every cell its footprint touches, so a point query
+    only tests the few boxes sharing the point's cell.
+    """
+    def __init__(self, platforms, cell=200.0):
+        self.cell = cell
+        self.count = len(platforms)
+        cells = {}
+        for box in platforms:
+            x, _, z, w, _, d = box
+            for cx in range(self._coord(x - w / 2), self._coord(x + w / 2) + 1):
+                for cz in range(self._coord(z - d / 2), self._coord(z + d / 2) + 1):
+                    cells.setdefault((cx, cz), []).append(box)
+        self.cells = {key: tuple(boxes) for key, boxes in cells.items()}
+
+    def __len__(self):
+        return self.count
+
+    def _coord(self, v):
+        return int(math.floor(v / self.cell))
+
+    def query(self, x, z):
+        """Candidate boxes whose footprint may contain (x, z)."""
+        return self.cells.get((self._coord(x), self._coord(z)), ())
+
+    def raycast_down(self, x, y, z):
+        """Height of the highest box top at or below y under (x, z), or None."""
+        best = None
+        for px, py, pz, pw, ph, pd in self.query(x, z):
+            if abs(x - px) <= pw / 2 and abs(z - pz) <= pd / 2:
+                top = py + ph / 2
+                if top <= y and (best is None or top > best):
+                    best = top
+        return best
+
+
+# -------------------------------------------------
+# BSP TREE
+# -------------------------------------------------
+def split_polygon(ids, dist, verts, eps):
+    """Cut a polygon (vertex ids, signed plane distances) into front and back parts.
+
+    New vertices on the plane are appended to verts. Either part may come
+    back with fewer than three corners, meaning nothing lies on that side.
+    """
+    front, back = [], []
+    k = len(ids)
+    for i in range(k):
+        a, b = dist[i], dist[(i + 1) % k]
+        if a >= -eps:
+            front.append(ids[i])
+        if a <= eps:
+            back.append(ids[i])
+        if (a > eps and b < -eps) or (a < -eps and b > eps):
+            p, q = verts[ids[i]], verts[ids[(i + 1) % k]]
+            t = a / (a - b)
+            verts.append((p[0] + (q[0] - p[0]) * t, p[1] + (q[1] - p[1]) * t,
+                          p[2] + (q[2] - p[2]) * t))
+            front.append(len(verts) - 1)
+            back.append(len(verts) - 1)
+    return front, back
+
+
+class BSPTree:
+    """Binary space partition of a course's static faces, for painter's order.
+
+    Built once from a CompiledMesh. Faces crossing a splitting plane are cut
+    in two, so `mesh` holds the pieces (grouped by node, face f belongs to
+    face_node[f]) and may have more faces than the source. Walking the tree
+    from the eye, far side first, gives a back-to-front order with no sort
+    and none of the overlap errors of sorting by average depth.
+
+    planes       (K, 4) float64 node planes (a, b, c, d): front is ax+by+cz >= d
+    front, back  (K,) int32 children of each node
+    face_node    (F,) int32 node holding each face of mesh
+    face_source  (F,) int32 face of the source mesh each piece was cut from
+    corner_cut   (C,) bool per corner of mesh: its edge runs inside its source
+                 face, made by a splitter rather than lying on one of the
+                 face's own edges (see seams)
+
+    A child is a node id (>= 0) or, for an empty half-space, ~slot (< 0).
+    Node 0 is the root. Dynamic objects are placed in the slot holding
+    their centre and drawn when the walk reaches it.
+    """
+    EPSILON    = 0.01
+    CANDIDATES = 24        # splitters scored per node
+    SPLIT_COST = 8         # one extra face weighs this much against imbalance
+
+    # Constructor arrays after the mesh, in order
+    PACKED = ("planes", "front", "back", "face_node", "face_source", "corner_cut")
+
+    def __init__(self, mesh, planes, front, back, face_node, face_source, corner_cut):
+        self.mesh = mesh
+        self.planes = planes
+        self.front_children = front
+        self.back_children = back
+        self.face_node = face_node
+        self.face_source = face_source
+        self.corner_cut = corner_cut
+        # The walk runs in Python; plain lists index faster than arrays
+        self.front = front.tolist()
+        self.back = back.tolist()
+        self.plane_rows = planes.tolist()
+        self.root = 0 if len(planes) else ~0
+        self.slot_count = len(planes) + 1
+        self._walk_key = None     # eye side of every plane at the last walk
+        self._ranks = None
+        self._seams = None
+
+    def arrays(self):
+        return (self.planes, self.front_children, self.back_children, self.face_node,
+                self.face_source, self.corner_cut)
+
+    @property
+    def seams(self):
+        """(cut, seamed): corner_cut as a list, and the set of pieces with
+        any cut edge, for the per-polygon draw loop."""
+        if self._seams is None:
+            offsets = self.mesh.face_offsets
+            cut = self.corner_cut
+            seamed = np.logical_or.reduceat(cut, offsets[:-1]) if len(cut) else cut
+            self._seams = (cut.tolist(), set(np.flatnonzero(seamed).tolist()))
+        return self._seams
+
+    @classmethod
+    def _cut_corners(cls, mesh, source, face_source):
+        """corner_cut for the pieces in mesh cut from the faces of source."""
+        pos = mesh.positions.astype(np.float64)
+        src_pos = source.positions.astype(np.float64)
+        eps = cls.EPSILON
+        cut = []
+        for piece, f in enumerate(face_source.tolist()):
+            p = pos[mesh.face_index[mesh.face_offsets[piece]:mesh.face_offsets[piece + 1]]]
+            a = src_pos[source.face_index[source.face_offsets[f]:source.face_offsets[f + 1]]]
+            ab = np.roll(a, -1, axis=0) - a
+            # t of every piece corner along every source edge, and its miss distance
+            t = np.einsum("pmk,mk->pm", p[:, None, :] - a[None, :, :], ab) / np.maximum(
+                np.einsum("mk,mk->m", ab, ab), 1e-12)
+            miss = np.linalg.norm(p[:, None, :] - (a[None, :, :] + t[:, :, None] * ab[None, :, :]), axis=2)
+            on = (miss <= eps) & (t >= -eps) & (t <= 1 + eps)
+            cut += (~(on & np.roll(on, -1, axis=0)).any(axis=1)).tolist()
+        return np.array(cut, dtype=bool)
+
+    @property
+    def nbytes(self):
+        return self.mesh.nbytes + sum(a.nbytes for a in self.arrays())
+
+    @classmethod
+    def build(cls, source):
+        """Partition a CompiledMesh; faces crossing a splitter are cut."""
+        verts = source.positions.astype(np.float64).tolist()
+        offsets = source.face_offsets.tolist()
+        flat = source.face_index.tolist()
+        normals = source.normals.astype(np.float64)
+        # A face's plane: its normal and offset along it
+        plane_d = np.einsum("ij,ij->i", normals, source.centroids.astype(np.float64))
+        planes = np.column_stack((normals, plane_d)).tolist()
+        polys = [(flat[offsets[f]:offsets[f + 1]], f) for f in range(source.face_count)]
+
+        nodes = []             # [plane, front, back, [(ids, source face), ...]]
+        slots = 0
+        stack = [(polys, None, 0)]
+        while stack:
+            polys, parent, side = stack.pop()
+            if not polys:
+                child = ~slots
+                slots += 1
+            else:
+                plane, on, front, back = cls._partition(polys, planes, verts)
+                child = len(nodes)
+                nodes.append([plane, None, None, on])
+                stack.append((front, child, 1))
+                stack.append((back, child, 2))
+            if parent is not None:
+                nodes[parent][side] = child
+
+        pieces = [(ids, f, k) for k, n in enumerate(nodes) for ids, f in n[3]]
+        face_offsets = np.zeros(len(pieces) + 1, dtype=np.int32)
+        face_offsets[1:] = np.cumsum([len(ids) for ids, _, _ in pieces])
+        src = np.array([f for _, f, _ in pieces], dtype=np.int64)
+        mesh = CompiledMesh(
+            np.array(verts, dtype=np.float32).reshape(-1, 3),
+            np.array([i for ids, _, _ in pieces for i in ids], dtype=np.int32),
+            face_offsets, source.face_color[src], source.palette,
+            source.face_object[src], source.normals[src], source.two_sided[src])
+        return cls(mesh,
+                   np.array([n[0] for n in nodes], dtype=np.float64).reshape(-1, 4),
+                   np.array([n[1] for n in nodes], dtype=np.int32),
+                   np.array([n[2] for n in nodes], dtype=np.int32),
+                   np.array([k for _, _, k in pieces], dtype=np.int32),
+                   src.astype(np.int32), cls._cut_corners(mesh, source, src))
+
+    @classmethod
+    def _partition(cls, polys, planes, verts):
+        """Pick a splitter and sort polys into (plane, on, front, back)."""
+        pos = np.array(verts, dtype=np.float64)
+        eps = cls.EPSILON
+        flat = np.array([i for ids, _ in polys for i in ids], dtype=np.int64)
+        starts = np.cumsum([0] + [len(ids) for ids, _ in polys[:-1]])
+        best = None
+        step = max(1, len(polys) // cls.CANDIDATES)
+        for ids, f in polys[::step]:
+            plane = planes[f]
+            if not any(plane[:3]):
+                continue       # degenerate face, no usable plane
+            dist = pos[flat] @ plane[:3] - plane[3]
+            lo = np.minimum.reduceat(dist, starts)
+            hi = np.maximum.reduceat(dist, starts)
+            splits = int(np.count_nonzero((lo < -eps) & (hi > eps)))
+            balance = abs(int(np.count_nonzero(lo >= -eps)) - int(np.count_nonzero(hi <= eps)))
+            score = splits * cls.SPLIT_COST + balance
+            if best is None or score < best[0]:
+                best = (score, plane, dist, lo, hi)
+        if best is None:
+            # Only degenerate faces left; park them on a plane nothing crosses
+            return [0.0, 0.0, 0.0, 0.0], polys, [], []
+        _, plane, dist, lo, hi = best
+        on, front, back = [], [], []
+        dist, lo, hi, starts = dist.tolist(), lo.tolist(), hi.tolist(), starts.tolist()
+        for p, (ids, f) in enumerate(polys):
+            if lo[p] >= -eps and hi[p] <= eps:
+                on.append((ids, f))
+            elif lo[p] >= -eps:
+                front.append((ids, f))
+            elif hi[p] <= eps:
+                back.append((ids, f))
+            else:
+                d = dist[starts[p]:starts[p] + len(ids)]
+                f_ids, b_ids = split_polygon(ids, d, verts, eps)
+                if len(f_ids) >= 3:
+                    front.append((f_ids, f))
+                if len(b_ids) >= 3:
+                    back.append((b_ids, f))
+        return plane, on, front, back
+
+    def locate(self, point):
+        """The slot (empty leaf) containing point."""
+        x, y, z = point
+        node = self.root
+        while node >= 0:
+            a, b, c, d = self.plane_rows[node]
+            node = self.front[node] if a * x + b * y + c * z >= d else self.back[node]
+        return ~node
+
+    def sides(self, eye):
+        """Whether eye is on the front of each node's plane."""
+        return self.planes[:, :3] @ np.asarray(eye, dtype=np.float64) >= self.planes[:, 3]
+
+    def walk(self, eye):
+        """Back-to-front sequence of node ids (>= 0) and slots (~slot, < 0)."""
+        count = len(self.front)
+        side = self.sides(eye).tolist()
+        seq = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node < 0:
+                seq.append(node)
+            elif node >= count:
+                seq.append(node - count)       # node faces, between its two halves
+            elif side[node]:
+                stack += (self.front[node], node + count, self.back[node])
+            else:
+                stack += (self.back[node], node + count, self.front[node])
+        return seq
+
+    def ranks(self, eye):
+        """Walk positions of every node and slot, (node_rank, slot_rank).
+
+        The walk only depends on which side of each plane the eye is, which
+        rarely changes between frames, so the last result is reused.
+        """
+        key = np.packbits(self.sides(eye)).tobytes()
+        if key != self._walk_key:
+            seq = np.array(self.walk(eye), dtype=np.int64)
+            pos = np.arange(len(seq))
+            is_node = seq >= 0
+            node_rank = np.zeros(len(self.front), dtype=np.int64)
+            node_rank[seq[is_node]] = pos[is_node]
+            slot_rank = np.zeros(self.slot_count, dtype=np.int64)
+            slot_rank[~seq[~is_node]] = pos[~is_node]
+            self._walk_key, self._ranks = key, (node_rank, slot_rank)
+        return self._ranks
+
+    def order(self, render_list, eye, dyn_slots):
+        """Indices into render_list in painter's order.
+
+        Keys below mesh.face_count are faces of self.mesh; the rest are
+        dynamic faces, key - face_count indexing dyn_slots. Polygons sharing
+        a node or a slot are drawn farthest first.
+        """
+        if not render_list:
+            return []
+        node_rank, slot_rank = self.ranks(eye)
+
+        n = len(render_list)
+        depth = np.fromiter(map(operator.itemgetter(0), render_list), dtype=np.float64, count=n)
+        keys = np.fromiter(map(operator.itemgetter(1), render_list), dtype=np.int64, count=n)
+        static = keys < self.mesh.face_count
+        rank = np.empty(n, dtype=np.int64)
+        rank[static] = node_rank[self.face_node[keys[static]]]
+        if not static.all():
+            slots = np.asarray(dyn_slots, dtype=np.int64)
+            rank[~static] = slot_rank[slots[keys[~static] - self.mesh.face_count]]
+        return np.lexsort((-depth, rank)).tolist()
+
 
 # -------------------------------------------------
 # WORLD BUILDER (base class)
@@ -359,6 +1428,143 @@ class WorldBase:
         self.sky_color  = SKY_BLUE
         self.name       = "Unknown"
         self.star_count = 0
+        self.face_object  = []   # per-face builder object id
+        self.face_two_sided = []
+        self.object_spans = []   # (first_vert, end_vert) per builder object
+        self._mesh      = None
+        self._platform_grid = None
+        self._star_index    = None
+        self._coin_index    = None
+        self._depth_sorter  = None
+        self._bsp           = None
+        self._item_slots    = None
+        self.compile_stats  = None   # optimize_mesh() counts; None when loaded from cache
+
+    @property
+    def platform_grid(self):
+        """PlatformGrid over platforms; built on first use, after build() has run."""
+        if self._platform_grid is None:
+            self._platform_grid = PlatformGrid(self.platforms)
+        return self._platform_grid
+
+    @property
+    def bsp(self):
+        """BSPTree over the compiled mesh; built on first use."""
+        if self._bsp is None:
+            self._bsp = BSPTree.build(self.mesh)
+        return self._bsp
+
+    @property
+    def item_slots(self):
+        """BSP slot of each star and coin at rest, keyed by class.
+
+        Coins spin in place and stars bob by a few units, so a collectible
+        is merged into the BSP order by where it rests rather than
+        located again every frame.
+        """
+        if self._item_slots is None:
+            self._item_slots = {
+                cls: np.array([self.bsp.locate(cls.TEMPLATE.center + (item.x, item.y, item.z))
+                               for item in items], dtype=np.int64)
+                for cls, items in ((Star, self.stars), (Coin, self.coins))}
+        return self._item_slots
+
+    @property
+    def depth_sorter(self):
+        """DepthSorter carrying this course's draw order from frame to frame."""
+        if self._depth_sorter is None:
+            self._depth_sorter = DepthSorter()
+        return self._depth_sorter
+
+    def warm(self):
+        """Build everything render_world() would otherwise build on the first
+        frame: the BSP and its seam flags, the cull spheres and crease edges
+        of the mesh drawn, and the item slots."""
+        mesh = self.bsp.mesh if render_options["bsp"] else self.mesh
+        mesh.spheres
+        mesh.edges
+        self.bsp.seams
+        self.item_slots
+
+    def reset_collectibles(self):
+        """Put every star and coin back, as on a fresh build."""
+        for star in self.stars:
+            star.collected = False
+        self._star_index = None
+        self.begin_visit()
+
+    def begin_visit(self, collected_stars=None):
+        """Set the course up for entering it: every coin back (Mario's coin
+        count starts at 0) and the animations restarted, so a visit plays
+        the same whether the world is fresh or cached. Collected stars stay
+        collected; collected_stars, one flag per star, overrides them (replays).
+        """
+        if collected_stars is not None:
+            for star, collected in zip(self.stars, collected_stars):
+                star.collected = bool(collected)
+            self._star_index = None
+        for star in self.stars:
+            star.bob = 0.0
+        for coin in self.coins:
+            coin.collected = False
+            coin.spin = 0.0
+        self._coin_index = None
+
+    def collected_stars(self):
+        return bytes(star.collected for star in self.stars)
+
+    def nbytes(self):
+        """Approximate memory held: mesh arrays plus the gameplay objects."""
+        size = self.mesh.nbytes + sys.getsizeof(self.platforms)
+        if self._bsp is not None:
+            size += self._bsp.nbytes
+        for box in self.platforms:
+            size += sys.getsizeof(box) + sum(sys.getsizeof(v) for v in box)
+        for item in self.stars + self.coins:
+            size += sys.getsizeof(item) + sys.getsizeof(item.__dict__)
+        return size
+
+    @property
+    def star_index(self):
+        if self._star_index is None:
+            self._star_index = CollectibleIndex(self.stars)
+        return self._star_index
+
+    @property
+    def coin_index(self):
+        if self._coin_index is None:
+            self._coin_index = CollectibleIndex(self.coins)
+        return self._coin_index
+
+    def compile(self):
+        """Freeze the built geometry into an optimized CompiledMesh.
+
+        The verts/faces authoring lists are released afterwards, so the
+        add_* builders must not be called on a compiled world. The
+        optimize_mesh() counts are kept in compile_stats.
+        """
+        mesh = CompiledMesh.from_lists(self.verts, self.faces, self.face_object,
+                                       self.object_spans, self.face_two_sided)
+        self._mesh, self.compile_stats = optimize_mesh(mesh)
+        self.verts = None
+        self.faces = None
+        self.face_object = self.face_two_sided = self.object_spans = None
+        return self._mesh
+
+    @property
+    def mesh(self):
+        """Compiled geometry; compiles on first use, after build() has run."""
+        if self._mesh is None:
+            self.compile()
+        return self._mesh
+
+    def _end_object(self, first_vert, two_sided=False):
+        """Tag the faces added since the last call as one builder object."""
+        obj = len(self.object_spans)
+        self.object_spans.append((first_vert, len(self.verts)))
+        n = len(self.faces) - len(self.face_object)
+        self.face_object += [obj] * n
+        self.face_two_sided += [two_sided] * n
 
     def add_box(self, x, y, z, w, h, d, color, collide=False):
         idx = len(self.verts)
@@ -371,6 +1577,7 @@ class WorldBase:
         ]
         for f in [[0,1,2,3],[4,5,6,7],[0,4,7,3],[1,5,6,2],[3,2,6,7],[0,1,5,4]]:
             self.faces.append(([i + idx for i in f], color))
+        self._end_object(idx)
         if collide:
             self.platforms.append((x, y, z, w, h, d))
 
@@ -385,6 +1592,7 @@ class WorldBase:
         for f in [[0,1,4],[1,2,4],[2,3,4],[3,0,4]]:
             self.faces.append(([i + idx for i in f], color))
         self.faces.append(([idx, idx+1, idx+2, idx+3], color))
+        self._end_object(idx)
 
     def add_slope(self, x, y, z, w, h, d, color):
         """Wedge/ramp shape"""
@@ -397,6 +1605,7 @@ class WorldBase:
         ])
         for f in [[0,1,2,3],[2,5,4,3],[0,1,5,4],[0,3,4],[1,2,5]]:
             self.faces.append(([i + idx for i in f], color))
+        self._end_object(idx)
 
     def add_cylinder_approx(self, x, y, z, r, h, segments, color):
         """Approximate cylinder with polygon faces"""
@@ -420,6 +1629,8 @@ class WorldBase:
             t0 = b0 + 1
             t1 = b1 + 1
             self.faces.append(([b0, b1, t1, t0], color))
+        # No caps: the inside is visible, so never back-face cull it
+        self._end_object(idx, two_sided=True)
 
     def add_star(self, x, y, z):
         self.stars.append(Star(x, y, z))
@@ -477,9 +1688,9 @@ class CastleGrounds(WorldBase):
         self.add_box(240, 200, 750, 110, 350, 110, STONE_GRAY)
         self.add_roof(240, 420, 750, 130, 110, 130, ROOF_RED)
         # Moat
-        self.add_box(0, -5, 450, 700, 8, 100, MOAT_BLUE)
-        self.add_box(-350, -5, 600, 100, 8, 400, MOAT_BLUE)
-        self.add_box(350, -5, 600, 100, 8, 400, MOAT_BLUE)
+        self.add_box(0, 2, 450, 700, 8, 100, MOAT_BLUE)
+        self.add_box(-350, 2, 600, 100, 8, 400, MOAT_BLUE)
+        self.add_box(350, 2, 600, 100, 8, 400, MOAT_BLUE)
         # Bridge over moat
         self.add_box(0, 5, 450, 180, 14, 110, WOOD_BROWN, collide=True)
         # Trees
@@ -676,7 +1887,7 @@ class CoolCoolMountain(WorldBase):
         # Penguin slide area
         self.add_slope(-100, 160, 0, 200, -100, 400, ICE_BLUE)
         # Frozen lake
-        self.add_box(300, -5, -600, 500, 8, 400, ICE_BLUE)
+        self.add_box(300, 2, -600, 500, 8, 400, ICE_BLUE)
         # Pine trees (cone shaped)
         for pos in [(-700, -700), (-600, -400), (700, -600), (600, -300), (-800, 500), (800, 400)]:
             self.add_box(pos[0], 25, pos[1], 25, 80, 25, TRUNK_BROWN)
@@ -775,7 +1986,7 @@ class HazyMazeCave(WorldBase):
         self.add_box(300, 50, -400, 40, 100, 400, CAVE_DARK)
         self.add_box(-200, 50, -200, 40, 100, 400, CAVE_DARK)
         # Underground lake
-        self.add_box(-700, -10, 600, 600, 8, 600, DEEP_WATER)
+        self.add_box(-700, 2, 600, 600, 8, 600, DEEP_WATER)
         # Dorrie island
         self.add_box(-700, 0, 600, 150, 20, 150, CAVE_BROWN, collide=True)
         # Metal cap area
@@ -859,8 +2070,8 @@ class ShiftingSandLand(WorldBase):
     def build(self):
         # Desert floor
         self.add_box(0, 0, 0, 3000, 10, 3000, SAND_YELLOW)
-        # Quicksand pit (visual only - slightly lower)
-        self.add_box(-400, -8, 0, 400, 6, 400, DARK_BROWN)
+        # Quicksand pit (visual only)
+        self.add_box(-400, 3, 0, 400, 6, 400, DARK_BROWN)
         # Main Pyramid
         self.add_box(0, 40, 400, 500, 80, 500, PYRAMID_TAN, collide=True)
         self.add_box(0, 100, 400, 380, 60, 380, PYRAMID_TAN, collide=True)
@@ -868,7 +2079,7 @@ class ShiftingSandLand(WorldBase):
         # Pyramid entrance
         self.add_box(0, 50, 150, 80, 60, 10, BLACK)
         # Oasis
-        self.add_box(600, -3, -500, 250, 8, 250, WATER_BLUE)
+        self.add_box(600, 2, -500, 250, 8, 250, WATER_BLUE)
         self.add_tree(600, -500, 60, 80, 60)
         self.add_tree(650, -450, 60, 80, 60)
         # Pillars
@@ -968,7 +2179,7 @@ class SnowmansLand(WorldBase):
         # Nose
         self.add_box(0, 270, 425, 10, 10, 30, LAVA_ORANGE)
         # Frozen lake
-        self.add_box(-500, -5, -300, 500, 8, 500, ICE_BLUE)
+        self.add_box(-500, 2, -300, 500, 8, 500, ICE_BLUE)
         # Igloo
         self.add_box(500, 30, -400, 160, 80, 160, SNOW_WHITE)
         self.add_roof(500, 90, -400, 180, 60, 180, SNOW_WHITE)
@@ -1114,8 +2325,8 @@ class TinyHugeIsland(WorldBase):
         self.add_box(0, 200, 300, 300, 100, 300, GRASS_GREEN, collide=True)
         self.add_roof(0, 300, 300, 350, 150, 350, DARK_GREEN)
         # Beach area
-        self.add_box(0, -3, -700, 800, 8, 300, SAND_YELLOW)
-        self.add_box(0, -8, -900, 800, 6, 200, WATER_BLUE)
+        self.add_box(0, 3, -700, 800, 8, 300, SAND_YELLOW)
+        self.add_box(0, 3, -900, 800, 6, 200, WATER_BLUE)
         # Goombas area (tiny mushrooms as size reference)
         self.add_box(-400, 10, -300, 20, 15, 20, DARK_BROWN)
         self.add_box(-400, 20, -300, 25, 8, 25, MARIO_RED)
@@ -1137,7 +2348,7 @@ class TinyHugeIsland(WorldBase):
             self.add_box(px, 15, pz, 15, 40, 15, DARK_GREEN)
             self.add_box(px, 40, pz, 30, 15, 30, MARIO_RED)
         # Water pools
-        self.add_box(-700, -5, 700, 300, 6, 300, WATER_BLUE)
+        self.add_box(-700, 3, 700, 300, 6, 300, WATER_BLUE)
         # Trees
         self.add_tree(-800, -200)
         self.add_tree(800, -300)
@@ -1299,127 +2510,979 @@ COURSE_LIST = [
 ]
 
 # -------------------------------------------------
-# RENDER ENGINE
+# COURSE GEOMETRY CACHE
 # -------------------------------------------------
-def render_world(screen, world, mario, cam):
-    screen.fill(world.sky_color)
-    render_list = []
+# Bump when the compile pipeline or the file layout changes
+GEOMETRY_FORMAT = 5
+GEOMETRY_MAGIC  = b"UM3DGEO\0"
+GEOMETRY_CACHE_DIR = os.path.join(user_cache_dir(), "courses")
+
+def _source_of(obj):
+    """Source text of a function, or of every method a class defines.
+
+    Classes are read method by method because inspect.getsource on a class
+    re-parses the whole module.
+    """
+    return "".join(inspect.getsource(func) for func in _functions_of(obj))
+
+# Value types whose repr is stable enough to key the cache on
+_CONSTANT_TYPES = (int, float, str, bytes, tuple, frozenset)
+
+def _functions_of(obj):
+    """obj itself if it is a function, else every function its class defines."""
+    if not inspect.isclass(obj):
+        return [obj]
+    funcs = []
+    for attr in vars(obj).values():
+        if isinstance(attr, (staticmethod, classmethod)):
+            attr = attr.__func__
+        elif isinstance(attr, property):
+            attr = attr.fget
+        if inspect.isfunction(attr):
+            funcs.append(attr)
+    return funcs
+
+def _constants_of(obj):
+    """repr of the constants obj depends on besides its source text.
+
+    That is every module global its code reads by name (palette colors,
+    OPTIMIZE_TOLERANCE, ...) and, for a class, its own data attributes
+    (BSPTree.EPSILON, ...). Tuning one of them changes the key without a
+    GEOMETRY_FORMAT bump.
+    """
+    names = set()
+    codes = [func.__code__ for func in _functions_of(obj)]
+    while codes:
+        code = codes.pop()
+        names.update(code.co_names)
+        codes += [c for c in code.co_consts if inspect.iscode(c)]
+    module = globals()
+    values = [(name, module[name]) for name in sorted(names)
+              if isinstance(module.get(name), _CONSTANT_TYPES)]
+    if inspect.isclass(obj):
+        values += [(name, value) for name, value in vars(obj).items()
+                   if not name.startswith("__") and isinstance(value, _CONSTANT_TYPES)]
+    return repr(values)
+
+_source_hashes = {}
+
+def course_source_hash(WorldClass):
+    """Hash of everything that decides a course's compiled geometry.
+
+    That is the course class (its build()), the builders in WorldBase, the
+    compile step and optimizer, the BSP build, the constants all of those
+    read (see _constants_of) and GEOMETRY_FORMAT. None when the source is
+    unavailable.
+    """
+    if WorldClass not in _source_hashes:
+        h = hashlib.sha256(str(GEOMETRY_FORMAT).encode())
+        try:
+            for obj in (WorldClass, WorldBase, CompiledMesh, face_normals,
+                        optimize_mesh, merge_polygons, _edge_at, BSPTree, split_polygon):
+                h.update(_source_of(obj).encode())
+                h.update(_constants_of(obj).encode())
+            _source_hashes[WorldClass] = h.hexdigest()
+        except (OSError, TypeError):
+            _source_hashes[WorldClass] = None
+    return _source_hashes[WorldClass]
+
+def save_course_geometry(world, path, source_hash):
+    """Write a compiled world as a JSON header followed by raw aligned arrays."""
+    mesh, bsp = world.mesh, world.bsp
+    arrays = {name: getattr(mesh, name) for name in CompiledMesh.PACKED}
+    arrays.update({f"bsp_{name}": getattr(bsp.mesh, name) for name in CompiledMesh.PACKED})
+    arrays.update({f"bsp_{name}": arr for name, arr in zip(BSPTree.PACKED, bsp.arrays())})
+    arrays["platforms"] = np.array(world.platforms, dtype=np.float64).reshape(-1, 6)
+    arrays["stars"] = np.array([(s.x, s.y, s.z) for s in world.stars], dtype=np.float64).reshape(-1, 3)
+    arrays["coins"] = np.array([(c.x, c.y, c.z) for c in world.coins], dtype=np.float64).reshape(-1, 3)
+    layout = {}
+    offset = 0
+    for name, arr in arrays.items():
+        offset = (offset + 63) & ~63
+        layout[name] = [arr.dtype.str, list(arr.shape), offset]
+        offset += arr.nbytes
+    header = json.dumps({
+        "format": GEOMETRY_FORMAT,
+        "source": source_hash,
+        "name": world.name,
+        "sky_color": list(world.sky_color),
+        "spawn": list(world.spawn),
+        "star_count": world.star_count,
+        "palette": [list(c) for c in mesh.palette],
+        "arrays": layout,
+    }).encode()
+    data_start = (len(GEOMETRY_MAGIC) + 4 + len(header) + 63) & ~63
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(GEOMETRY_MAGIC + struct.pack("<I", len(header)) + header)
+        for name, arr in arrays.items():
+            f.seek(data_start + layout[name][2])
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp, path)
+
+def load_course_geometry(WorldClass, path, source_hash):
+    """Map a cache file written by save_course_geometry back into a world.
+
+    Mesh arrays are read-only views straight into the mapped file. Returns
+    None when the file is missing, stale or unreadable.
+    """
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        if mm[:len(GEOMETRY_MAGIC)] != GEOMETRY_MAGIC:
+            return None
+        (header_len,) = struct.unpack_from("<I", mm, len(GEOMETRY_MAGIC))
+        header_start = len(GEOMETRY_MAGIC) + 4
+        header = json.loads(mm[header_start:header_start + header_len])
+        if header.get("format") != GEOMETRY_FORMAT or header.get("source") != source_hash:
+            return None
+        data_start = (header_start + header_len + 63) & ~63
+        arrays = {}
+        for name, (dtype, shape, offset) in header["arrays"].items():
+            count = int(np.prod(shape))
+            arrays[name] = np.frombuffer(mm, dtype=dtype, count=count,
+                                         offset=data_start + offset).reshape(shape)
+    except (ValueError, KeyError, struct.error):
+        return None
 
-    # World geometry
-    for indices, color in world.faces:
-        pts = []
-        z_sum = 0
-        visible = True
+    world = WorldClass.__new__(WorldClass)
+    WorldBase.__init__(world)
+    world.name       = header["name"]
+    world.sky_color  = tuple(header["sky_color"])
+    world.spawn      = tuple(header["spawn"])
+    world.star_count = header["star_count"]
+    world.platforms  = [tuple(p) for p in arrays["platforms"].tolist()]
+    world.stars      = [Star(*p) for p in arrays["stars"].tolist()]
+    world.coins      = [Coin(*p) for p in arrays["coins"].tolist()]
+    palette = [tuple(c) for c in header["palette"]]
+    def mesh_from(prefix):
+        return CompiledMesh(*(arrays[prefix + name] for name in CompiledMesh.PACKED[:4]), palette,
+                            *(arrays[prefix + name] for name in CompiledMesh.PACKED[4:]))
+    world._mesh = mesh_from("")
+    world._bsp = BSPTree(mesh_from("bsp_"), *(arrays[f"bsp_{name}"] for name in BSPTree.PACKED))
+    world.verts = world.faces = None
+    world.face_object = world.face_two_sided = world.object_spans = None
+    return world
+
+def load_course(WorldClass, cache_dir=GEOMETRY_CACHE_DIR):
+    """Build a course, or map its compiled geometry from the on-disk cache.
+
+    The cache file is keyed by course_source_hash(), so editing a course's
+    build() (or the builders) rebuilds it once. cache_dir=None disables it.
+    Either way the world is warmed, so when CoursePrebuilder runs this off
+    the main thread the first frame drawn does no building of its own.
+    """
+    source_hash = course_source_hash(WorldClass) if cache_dir else None
+    world = None
+    if source_hash:
+        path = os.path.join(cache_dir, f"{WorldClass.__name__}.geo")
+        world = load_course_geometry(WorldClass, path, source_hash)
+    if world is None:
+        world = WorldClass()
+        world.compile()
+        world.bsp          # build the BSP here too, so it is saved with the mesh
+        if source_hash:
+            try:
+                save_course_geometry(world, path, source_hash)
+            except OSError:
+                pass
+    world.warm()
+    return world
+
+
+class CourseCache:
+    """Recently played worlds kept alive under a memory budget, LRU first out.
+
+    Worlds keep their collected stars, so coming back to a course finds
+    them gone (begin_visit() puts the coins back); reset_all() restores
+    everything (e.g. on game over). The most recently stored world is
+    never evicted, even when it alone exceeds the budget.
+    """
+    def __init__(self, budget_bytes=32 * 1024 * 1024):
+        self.budget = budget_bytes
+        self.worlds = collections.OrderedDict()   # course index -> world
+        self.sizes = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, index):
+        return index in self.worlds
+
+    def get(self, index):
+        world = self.worlds.get(index)
+        if world is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.worlds.move_to_end(index)
+        return world
+
+    def put(self, index, world):
+        self.worlds[index] = world
+        self.worlds.move_to_end(index)
+        self.sizes[index] = world.nbytes()
+        while self.total_bytes() > self.budget and len(self.worlds) > 1:
+            old, _ = self.worlds.popitem(last=False)
+            del self.sizes[old]
+
+    def total_bytes(self):
+        return sum(self.sizes.values())
+
+    def reset_all(self):
+        for world in self.worlds.values():
+            world.reset_collectibles()
+
+    def report(self):
+        """One line per cached course, most recent last, plus a totals line."""
+        lines = [f"{COURSE_LIST[i][0]:<22}{self.sizes[i] / 1024:>8.1f} KB" for i in self.worlds]
+        lines.append(f"hits {self.hits}  misses {self.misses}  "
+                     f"{self.total_bytes() / 1024:.1f}/{self.budget / 1024:.0f} KB")
+        return lines
+
+
+class CoursePrebuilder:
+    """Builds courses on a worker thread ahead of the player confirming them.
+
+    The level select reports the cursor through hover(); once it has rested
+    on a course for DWELL_MS the course is queued. Moving on cancels
+    queued builds and forgets finished ones for other courses; a build
+    already running cannot be interrupted, and its result is dropped.
+    """
+    DWELL_MS = 150
+
+    def __init__(self, loader=load_course, cache=None):
+        self.loader = loader
+        self.cache = cache     # courses already in this CourseCache are not rebuilt
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=1,
+                                                          thread_name_prefix="prebuild")
+        self.futures = {}      # course index -> Future of a built world
+        self.hover_index = None
+        self.hover_since = 0
+
+    def hover(self, index, now_ms):
+        if index != self.hover_index:
+            self.hover_index = index
+            self.hover_since = now_ms
+            for other in [i for i in self.futures if i != index]:
+                self.futures.pop(other).cancel()
+        elif now_ms - self.hover_since >= self.DWELL_MS:
+            if self.cache is None or index not in self.cache:
+                self.request(index)
+
+    def request(self, index):
+        if index not in self.futures:
+            self.futures[index] = self.pool.submit(self.loader, COURSE_LIST[index][1])
+
+    def take(self, index):
+        """The finished world for index, handed over once; None while building."""
+        future = self.futures.get(index)
+        if future is None or not future.done():
+            return None
+        del self.futures[index]
+        return future.result()
+
+    def shutdown(self):
+        for future in self.futures.values():
+            future.cancel()
+        self.futures.clear()
+        self.pool.shutdown(wait=False)
+
+
+# -------------------------------------------------
+# RENDER ENGINE
+# -------------------------------------------------
+def project_faces(verts, faces, cam, render_list, key_base=0):
+    """Project a mesh and append (depth, key, pts, color, zs) for each face fully in front.
+
+    key is key_base plus the face's position in faces, so the same face
+    keeps the same key from frame to frame.
+
+    Every vertex is projected and near-plane tested exactly once into a buffer
+    indexed by vertex id; faces only look up their already projected corners,
+    so a box vertex shared by three faces costs one transform, not three.
+    """
+    if not len(verts):
+        return
+    sx, sy, rz = project_vertices(verts, cam.x, cam.y, cam.z, cam.yaw)
+    front = (rz > NEAR_Z).tolist()
+    pts_buf = list(zip(sx.tolist(), sy.tolist()))
+    rz = rz.tolist()
+    for key, (indices, color) in enumerate(faces, key_base):
         for i in indices:
-            res = project_point(*world.verts[i], cam.x, cam.y, cam.z, cam.yaw)
-            if not res:
-                visible = False
+            if not front[i]:
                 break
-            pts.append((res[0], res[1]))
-            z_sum += res[2]
-        if visible and len(pts) >= 3:
-            render_list.append((z_sum / len(indices), pts, color))
-
-    # Collectibles
-    for star in world.stars:
-        star.update()
-        sv, sf = star.get_mesh()
-        for indices, color in sf:
-            pts = []
+        else:
             z_sum = 0
-            visible = True
             for i in indices:
-                res = project_point(*sv[i], cam.x, cam.y, cam.z, cam.yaw)
-                if not res:
-                    visible = False
-                    break
-                pts.append((res[0], res[1]))
-                z_sum += res[2]
-            if visible and len(pts) >= 3:
-                render_list.append((z_sum / len(indices), pts, color))
+                z_sum += rz[i]
+            render_list.append((z_sum / len(indices), key, [pts_buf[i] for i in indices], color,
+                                [rz[i] for i in indices]))
+
+def project_corners(verts, corners, colors, cam, render_list, key_base=0):
+    """project_faces for faces given as an (F, k) array of vertex ids.
+
+    Every face has k corners, so the near-plane test, depths and screen
+    corners of all of them are worked out in a few array operations;
+    colors holds one entry per face.
+    """
+    if not len(corners):
+        return
+    sx, sy, rz = project_vertices(verts, cam.x, cam.y, cam.z, cam.yaw)
+    keep = np.flatnonzero((rz[corners] > NEAR_Z).all(axis=1))
+    corners = corners[keep]
+    zs = rz[corners]
+    pts = np.stack((sx[corners], sy[corners]), axis=2).tolist()
+    for face, depth, face_pts, face_zs in zip(keep.tolist(), zs.mean(axis=1).tolist(), pts, zs.tolist()):
+        render_list.append((depth, key_base + face, face_pts, colors[face], face_zs))
+
+def project_mesh(mesh, cam, render_list, clipped=None):
+    """Cull, clip and project a CompiledMesh into render_list.
+
+    Entries are (depth, key, pts, color, zs): mean camera depth, the face
+    index, screen corners, fill color and the camera depth of each corner.
+    Faces cut by the near plane have other corners than the mesh; their
+    keys are added to the clipped set when one is given.
+
+    Stages, all but clipping done in bulk:
+      0. objects: mesh.spheres drops whole builder objects outside the view
+         frustum; only the corners of the faces left are transformed
+      1. back-face cull: drop faces whose outward normal points away
+      2. near plane: faces fully in front pass, faces straddling the plane
+         are clipped against it, faces fully behind are dropped
+      3. viewport: drop faces whose screen bounds miss the 800x600 view
+    """
+    if not mesh.face_count:
+        return
+    faces = mesh.spheres.visible_faces(cam)
+    if not len(faces):
+        return
+    sizes = mesh.face_sizes[faces]
+    offsets = np.zeros(len(faces) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    starts = offsets[:-1]
+    corner = np.arange(offsets[-1]) + np.repeat(mesh.face_offsets[faces] - starts, sizes)
+    rx, ry, rz = camera_space(mesh.positions[mesh.face_index[corner]], cam.x, cam.y, cam.z, cam.yaw)
+    scale = FOCAL_LENGTH / np.maximum(rz, NEAR_Z)
+    xs = (rx * scale + SCREEN_CENTER[0]).astype(np.int64)
+    ys = (-ry * scale + SCREEN_CENTER[1]).astype(np.int64)
+
+    to_cam = np.array((cam.x, cam.y, cam.z), dtype=np.float32) - mesh.centroids[faces]
+    facing = np.einsum("ij,ij->i", mesh.normals[faces], to_cam) > 0
+    facing |= mesh.two_sided[faces]
+
+    front = rz > NEAR_Z
+    all_front = np.logical_and.reduceat(front, starts)
+    any_front = np.logical_or.reduceat(front, starts)
+
+    in_view = ((np.maximum.reduceat(xs, starts) >= 0) & (np.minimum.reduceat(xs, starts) < WIDTH) &
+               (np.maximum.reduceat(ys, starts) >= 0) & (np.minimum.reduceat(ys, starts) < HEIGHT))
+
+    whole = facing & all_front & in_view
+    partial = facing & any_front & ~all_front
+
+    depth = (np.add.reduceat(rz, starts) / sizes).tolist()
+    corners = np.stack((xs, ys), axis=1).tolist()
+    corner_z = rz.tolist()
+    offsets = offsets.tolist()
+    ids = faces.tolist()
+    palette, colors = mesh.palette, mesh.face_color[faces].tolist()
+    for j in np.flatnonzero(whole).tolist():
+        a, b = offsets[j], offsets[j + 1]
+        render_list.append((depth[j], ids[j], corners[a:b], palette[colors[j]], corner_z[a:b]))
+
+    if partial.any():
+        cam_pts = np.stack((rx, ry, rz), axis=1)
+        for j in np.flatnonzero(partial).tolist():
+            clip = clip_near(cam_pts[offsets[j]:offsets[j + 1]].tolist())
+            if clip and on_screen(clip[0]):
+                render_list.append((clip[1], ids[j], clip[0], palette[colors[j]], clip[2]))
+                if clipped is not None:
+                    clipped.add(ids[j])
+
+class DepthSorter:
+    """Painter's order that starts from the previous frame's order.
+
+    The camera moves smoothly, so last frame's back-to-front order is
+    nearly right for this one. Polygons are laid out in that order first
+    (an integer sort, linear) and then stably sorted by depth; timsort
+    runs in close to linear time on such nearly sorted input. After a
+    camera cut the previous order says nothing, so it is skipped.
+    """
+    CUT_DISTANCE = 400     # camera jump, world units
+    CUT_YAW      = 0.6     # camera turn, radians
 
-    for coin in world.coins:
-        coin.update()
-        cv, cf = coin.get_mesh()
-        for indices, color in cf:
-            pts = []
-            z_sum = 0
-            visible = True
-            for i in indices:
-                res = project_point(*cv[i], cam.x, cam.y, cam.z, cam.yaw)
-                if not res:
-                    visible = False
-                    break
-                pts.append((res[0], res[1]))
-                z_sum += res[2]
-            if visible and len(pts) >= 3:
-                render_list.append((z_sum / len(indices), pts, color))
-
-    # Mario
-    m_verts, m_faces = mario.get_mesh()
-    for indices, color in m_faces:
-        pts = []
-        z_sum = 0
-        visible = True
-        for i in indices:
-            res = project_point(*m_verts[i], cam.x, cam.y, cam.z, cam.yaw)
-            if not res:
-                visible = False
-                break
-            pts.append((res[0], res[1]))
-            z_sum += res[2]
-        if visible and len(pts) >= 3:
-            render_list.append((z_sum / len(indices), pts, color))
-
-    # Painter's algorithm
-    render_list.sort(key=lambda x: x[0], reverse=True)
-    for _, pts, color in render_list:
+    def __init__(self):
+        self.prev_keys = np.empty(0, dtype=np.int64)
+        self.prev_pose = None
+        self.full_sorts = 0
+
+    def is_cut(self, cam):
+        prev = self.prev_pose
+        if prev is None:
+            return True
+        moved = (cam.x - prev.x) ** 2 + (cam.y - prev.y) ** 2 + (cam.z - prev.z) ** 2
+        return moved > self.CUT_DISTANCE ** 2 or abs(cam.yaw - prev.yaw) > self.CUT_YAW
+
+    def order(self, render_list, cam):
+        """Indices into render_list, farthest first."""
+        if not render_list:
+            self.prev_keys = np.empty(0, dtype=np.int64)
+            return []
+        n = len(render_list)
+        depth = np.fromiter(map(operator.itemgetter(0), render_list), dtype=np.float64, count=n)
+        keys = np.fromiter(map(operator.itemgetter(1), render_list), dtype=np.int64, count=n)
+        if self.is_cut(cam) or not len(self.prev_keys):
+            self.full_sorts += 1
+            seed = np.arange(len(keys))
+        else:
+            # Rank of each key in last frame's order; new keys go last
+            rank = np.full(max(keys.max(), self.prev_keys.max()) + 1, len(self.prev_keys))
+            rank[self.prev_keys] = np.arange(len(self.prev_keys))
+            seed = np.argsort(rank[keys], kind="stable")
+        order = seed[np.argsort(-depth[seed], kind="stable")]
+        self.prev_keys = keys[order]
+        self.prev_pose = cam
+        return order.tolist()
+
+class ZBufferRaster:
+    """Software rasterizer: convex polygons into a NumPy color and depth buffer.
+
+    Each pixel keeps the nearest polygon, so nothing is sorted and faces
+    that cut through each other (tree roofs, stacked boxes) meet along the
+    right line. 1/z is affine in screen space across a planar face, so it
+    is fitted from the corners and compared per pixel. Colors are stored
+    as the surface's mapped pixel values; the buffers are 1/scale of the
+    screen and scaled up when blitted.
+    """
+    def __init__(self, size=(WIDTH, HEIGHT), scale=2):
+        self.scale = scale
+        self.size = size
+        w, h = size[0] // scale, size[1] // scale
+        self.pixels = np.zeros((w, h), dtype=np.uint32)     # surfarray layout, x first
+        self.inv_z = np.zeros((w, h), dtype=np.float32)      # 0 = nothing drawn yet
+        self.px = (np.arange(w) + 0.5)[:, None]
+        self.py = (np.arange(h) + 0.5)[None, :]
+        self.surface = None      # made on first use; importing must not touch SDL
+        self.mapped = {}
+
+    def map_color(self, color):
+        pixel = self.mapped.get(color)
+        if pixel is None:
+            if self.surface is None:
+                self.surface = pygame.Surface(self.pixels.shape, depth=32)
+            pixel = self.mapped[color] = self.surface.map_rgb(color)
+        return pixel
+
+    def clear(self, color):
+        self.pixels.fill(self.map_color(color))
+        self.inv_z.fill(0.0)
+
+    def fill_polygon(self, pts, zs, color):
+        p = np.array(pts, dtype=np.float64) / self.scale
+        w, h = self.inv_z.shape
+        x0, x1 = max(int(p[:, 0].min()), 0), min(int(p[:, 0].max()) + 1, w)
+        y0, y1 = max(int(p[:, 1].min()), 0), min(int(p[:, 1].max()) + 1, h)
+        if x0 >= x1 or y0 >= y1:
+            return
+        q = np.roll(p, -1, axis=0)
+        area = float(np.sum(p[:, 0] * q[:, 1] - q[:, 0] * p[:, 1]))
+        if area == 0.0:
+            return
+        X, Y = self.px[x0:x1], self.py[:, y0:y1]
+        inside = np.ones((x1 - x0, y1 - y0), dtype=bool)
+        for (ax, ay), (bx, by) in zip(p.tolist(), q.tolist()):
+            inside &= ((bx - ax) * (Y - ay) - (by - ay) * (X - ax)) * area >= 0
+        basis = np.column_stack((p, np.ones(len(p))))
+        a, b, c = np.linalg.lstsq(basis, 1.0 / np.asarray(zs, dtype=np.float64), rcond=None)[0]
+        inv_z = a * X + b * Y + c
+        depth = self.inv_z[x0:x1, y0:y1]
+        mask = inside & (inv_z > depth)
+        depth[mask] = inv_z[mask]
+        self.pixels[x0:x1, y0:y1][mask] = self.map_color(color)
+
+    def outline(self):
+        """Blacken pixels where the color changes, like the polygon outlines."""
+        c = self.pixels
+        edge = np.zeros(c.shape, dtype=bool)
+        np.not_equal(c[1:], c[:-1], out=edge[1:])
+        edge[:, 1:] |= c[:, 1:] != c[:, :-1]
+        c[edge] = self.map_color(BLACK)
+
+    def blit(self, screen):
+        pygame.surfarray.blit_array(self.surface, self.pixels)
+        pygame.transform.scale(self.surface, self.size, screen)
+
+def draw_edge_outlined(screen, render_list, order, mesh, clipped, corner_cut=None):
+    """Fill polygons in order, stroking each crease edge of mesh once.
+
+    An edge is stroked right after the last (nearest) of its faces is
+    filled, so nearer faces still cover it, and only once however many
+    faces share it. Clipped and dynamic faces are outlined whole. Edges
+    flagged in corner_cut (BSPTree.corner_cut of mesh) lie inside a source
+    face and are never stroked: where one piece meets two across a cut
+    they pair with nothing and would count as creases.
+    """
+    edges = mesh.edges
+    keys = np.fromiter((render_list[i][1] for i in order), dtype=np.int64, count=len(order))
+    whole = keys < mesh.face_count
+    if clipped:
+        whole &= ~np.isin(keys, list(clipped))
+    faces = keys[whole]
+    sizes = mesh.face_sizes[faces]
+    starts = np.repeat(mesh.face_offsets[faces] - np.cumsum(sizes) + sizes, sizes)
+    corners = starts + np.arange(len(starts))
+    corner_edge = edges.corner_edge[corners]
+    pos = np.repeat(np.flatnonzero(whole), sizes)
+    # Owner of an edge: the last of its faces in draw order
+    owner = np.full(edges.count, -1, dtype=np.int64)
+    np.maximum.at(owner, corner_edge, pos)
+    mine = edges.crease[corner_edge] & (owner[corner_edge] == pos)
+    if corner_cut is not None:
+        mine &= ~corner_cut[corners]
+    mine = mine.tolist()
+    whole = whole.tolist()
+    c = 0
+    for pos, i in enumerate(order):
+        _, _, pts, color, _ = render_list[i]
         pygame.draw.polygon(screen, color, pts)
+        if not whole[pos]:
+            pygame.draw.polygon(screen, BLACK, pts, 1)
+            continue
+        k = len(pts)
+        owned = mine[c:c + k]
+        c += k
+        if all(owned):
+            pygame.draw.lines(screen, BLACK, True, pts)
+        elif any(owned):
+            stroke_edges(screen, pts, owned)
+
+def stroke_edges(screen, pts, stroked):
+    """Draw the edges pts[j] -> pts[j + 1] of a polygon with stroked[j] set.
+
+    At least one edge must be left out; each run of stroked edges, starting
+    just after a gap, is one line strip.
+    """
+    k = len(pts)
+    start = stroked.index(False)
+    run = []
+    for step in range(1, k + 1):
+        j = (start + step) % k
+        if stroked[j]:
+            if not run:
+                run.append(pts[j])
+            run.append(pts[(j + 1) % k])
+        elif run:
+            pygame.draw.lines(screen, BLACK, False, run)
+            run = []
+
+# Seconds spent in each render_world stage during the last frame
+render_timings = {}
+
+# "bsp": order the course by walking world.bsp; off, depth-sort everything.
+# "backend": "polygon" draws in painter's order with pygame.draw,
+# "zbuffer" rasterizes through ZBufferRaster (F2 switches in game).
+# "outline": "faces" outlines every source polygon (not the BSP pieces cut
+# from it), "edges" strokes only crease edges, each once, "off" draws none
+# (F4 switches in game).
+render_options = {"bsp": True, "backend": "polygon", "outline": "faces"}
+RENDER_BACKENDS = ("polygon", "zbuffer")
+OUTLINE_MODES = ("faces", "edges", "off")
+
+zbuffer = ZBufferRaster()
+
+def draw_ordered(screen, entries, order, mesh, clipped, bsp=None):
+    """Fill entries in the given order, outlined per render_options["outline"].
+
+    bsp (the BSPTree mesh was cut by) keeps the outlines off the cuts
+    between pieces of one source face, so they follow source polygons.
+    """
+    outline = render_options["outline"]
+    if outline == "edges":
+        draw_edge_outlined(screen, entries, order, mesh, clipped,
+                           bsp.corner_cut if bsp is not None else None)
+        return
+    cut, seamed = bsp.seams if bsp is not None and outline == "faces" else ((), ())
+    for i in order:
+        _, key, pts, color, _ = entries[i]
+        pygame.draw.polygon(screen, color, pts)
+        if outline != "faces":
+            continue
+        if key in seamed and key not in clipped:
+            start = int(mesh.face_offsets[key])
+            kept = [not c for c in cut[start:start + len(pts)]]
+            if any(kept):
+                stroke_edges(screen, pts, kept)
+            continue
         pygame.draw.polygon(screen, BLACK, pts, 1)
 
+def entry_bounds(entries):
+    """(x0, y0, x1, y1) int arrays: screen bounds of each entry's polygon."""
+    n = len(entries)
+    bounds = np.empty((4, n), dtype=np.int64)
+    for i, entry in enumerate(entries):
+        xs = [p[0] for p in entry[2]]
+        ys = [p[1] for p in entry[2]]
+        bounds[:, i] = (min(xs), min(ys), max(xs), max(ys))
+    return bounds
+
+def merge_rects(rects):
+    """Union overlapping pygame.Rects until none overlap."""
+    rects = list(rects)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            j = rects[i].collidelist(rects[i + 1:])
+            if j >= 0:
+                rects[i] = rects[i].union(rects.pop(i + 1 + j))
+                merged = True
+                break
+    return rects
+
+
+class StaticLayer:
+    """The course drawn without Mario and the collectibles, kept while the camera rests.
+
+    Camera.update eases in, so a resting camera still drifts by tiny
+    amounts; a pose within POSITION_EPS / YAW_EPS of the last frame's is
+    treated as unchanged and the frame is drawn at the cached pose. The
+    polygon backend keeps a surface plus the projected static polygons,
+    the z-buffer backend its color and depth buffers.
+    """
+    POSITION_EPS = 0.05
+    YAW_EPS      = 1e-4
+
+    def __init__(self):
+        self.hits = 0
+        self.clear()
+
+    def clear(self):
+        """Drop the layer and its world; main() calls this when play leaves
+        a course, so a world CourseCache evicts is not kept alive here."""
+        self.key = None          # (world, backend, bsp, outline, screen size) of the layer
+        self.pose = None
+        self.last_pose = None
+        self.surface = None
+        self.scratch = None      # redraw area for the dynamic layer
+        self.entries = None
+        self.clipped = None
+        self.bounds = None
+        self.pixels = None
+        self.inv_z = None
+        self.rank = None         # painter's position of each static key, depth-sorted layers
+
+    def close(self, a, b):
+        return (b is not None and abs(a.x - b.x) <= self.POSITION_EPS and
+                abs(a.y - b.y) <= self.POSITION_EPS and abs(a.z - b.z) <= self.POSITION_EPS and
+                abs(a.yaw - b.yaw) <= self.YAW_EPS)
+
+    def lookup(self, key, cam):
+        """(pose to draw at, state): state "hit" reuses the layer, "capture"
+        redraws it at this pose, None renders the frame as usual."""
+        if self.key == key and self.close(cam, self.pose):
+            self.hits += 1
+            return self.pose, "hit"
+        resting = self.close(cam, self.last_pose)
+        self.last_pose = cam
+        self.key = None
+        return cam, ("capture" if resting else None)
+
+    def store(self, key, cam, entries, clipped):
+        self.key, self.pose = key, cam
+        self.entries, self.clipped = entries, clipped
+        self.bounds = entry_bounds(entries)
+        self.rank = None
+
+    def rank_order(self, order, face_count):
+        """Remember the depth-sorted order the layer was drawn in."""
+        keys = np.fromiter(map(operator.itemgetter(1), self.entries), dtype=np.int64, count=len(self.entries))
+        self.rank = np.full(face_count, len(keys), dtype=np.int64)
+        self.rank[keys[order]] = np.arange(len(keys))
+
+    def depth_order(self, entries):
+        """Indices into entries, farthest first, with equal depths kept in the
+        layer's order so a redrawn patch matches the pixels around it."""
+        n = len(entries)
+        depth = np.fromiter(map(operator.itemgetter(0), entries), dtype=np.float64, count=n)
+        keys = np.fromiter(map(operator.itemgetter(1), entries), dtype=np.int64, count=n)
+        static = keys < len(self.rank)
+        rank = np.full(n, len(self.rank))
+        rank[static] = self.rank[keys[static]]
+        seed = np.argsort(rank, kind="stable")
+        return seed[np.argsort(-depth[seed], kind="stable")].tolist()
+
+static_layer = StaticLayer()
+
+def render_world(screen, world, mario, cam, alpha=1.0):
+    """Draw the course, collectibles and Mario.
+
+    alpha in [0, 1] is how far the frame lies between the previous and the
+    current simulation tick; Mario and the camera are interpolated by it.
+    While the camera rests the course comes from static_layer and only
+    the screen around Mario and the collectibles is redrawn.
+    """
+    cam = cam.pose(alpha)
+    t0 = time.perf_counter()
+    use_zbuffer = render_options["backend"] == "zbuffer"
+    use_bsp = render_options["bsp"] and not use_zbuffer
+    static_mesh = world.bsp.mesh if use_bsp else world.mesh
+    bsp = world.bsp if use_bsp else None
+    key = (world, use_zbuffer, use_bsp, render_options["outline"], screen.get_size())
+    cam, state = static_layer.lookup(key, cam)
+
+    # World geometry (whole vertex array projected in one batch)
+    if state == "hit":
+        render_list = list(static_layer.entries)
+        clipped = static_layer.clipped
+    else:
+        render_list = []
+        clipped = set()
+        project_mesh(static_mesh, cam, render_list, clipped)
+    n_static = len(render_list)
+    t1 = time.perf_counter()
+
+    # Collectibles: each type's template placed for all live instances at once
+    key_base = static_mesh.face_count
+    n_objects = 0
+    dyn_object = []     # which object each dynamic face came from
+    dyn_slots = []      # BSP slot of each dynamic face's object
+    for cls, items in ((Star, world.stars), (Coin, world.coins)):
+        live_ids = [i for i, item in enumerate(items) if not item.collected]
+        if not live_ids:
+            continue
+        live = [items[i] for i in live_ids]
+        template = cls.TEMPLATE
+        colors = template.colors * len(live)
+        project_corners(cls.batch_verts(live), template.corners(len(live)), colors,
+                        cam, render_list, key_base)
+        dyn_object += np.repeat(np.arange(n_objects, n_objects + len(live)), template.face_count).tolist()
+        if use_bsp:
+            dyn_slots += np.repeat(world.item_slots[cls][live_ids], template.face_count).tolist()
+        n_objects += len(live)
+        key_base += len(colors)
+
+    mv, mf = mario.get_mesh(alpha)
+    project_faces(np.array(mv, dtype=np.float64), mf, cam, render_list, key_base=key_base)
+    dyn_object += [n_objects] * len(mf)
+    if use_bsp:
+        n = len(mv)
+        center = (sum(v[0] for v in mv) / n, sum(v[1] for v in mv) / n,
+                  sum(v[2] for v in mv) / n)
+        dyn_slots += [world.bsp.locate(center)] * len(mf)
+    t2 = time.perf_counter()
+
+    def order_of(entries):
+        # Painter's algorithm: BSP walk for the course, objects merged in by slot
+        if use_bsp:
+            return world.bsp.order(entries, (cam.x, cam.y, cam.z), dyn_slots)
+        return world.depth_sorter.order(entries, cam)
+
+    if use_zbuffer:
+        t3 = time.perf_counter()
+        if state == "hit":
+            np.copyto(zbuffer.pixels, static_layer.pixels)
+            np.copyto(zbuffer.inv_z, static_layer.inv_z)
+        else:
+            zbuffer.clear(world.sky_color)
+            for _, _, pts, color, zs in render_list[:n_static]:
+                zbuffer.fill_polygon(pts, zs, color)
+            if state == "capture":
+                static_layer.store(key, cam, render_list[:n_static], clipped)
+                static_layer.pixels = zbuffer.pixels.copy()
+                static_layer.inv_z = zbuffer.inv_z.copy()
+        for _, _, pts, color, zs in render_list[n_static:]:
+            zbuffer.fill_polygon(pts, zs, color)
+        if render_options["outline"] != "off":
+            zbuffer.outline()
+        zbuffer.blit(screen)
+    elif state is None:
+        order = order_of(render_list)
+        t3 = time.perf_counter()
+        screen.fill(world.sky_color)
+        draw_ordered(screen, render_list, order, static_mesh, clipped, bsp)
+    else:
+        if state == "capture":
+            static = render_list[:n_static]
+            if static_layer.surface is None or static_layer.surface.get_size() != screen.get_size():
+                static_layer.surface = pygame.Surface(screen.get_size())
+                static_layer.scratch = pygame.Surface(screen.get_size())
+            static_layer.surface.fill(world.sky_color)
+            order = order_of(static)
+            draw_ordered(static_layer.surface, static, order, static_mesh, clipped, bsp)
+            static_layer.store(key, cam, static, clipped)
+            if not use_bsp:
+                static_layer.rank_order(order, static_mesh.face_count)
+        t3 = time.perf_counter()
+        screen.blit(static_layer.surface, (0, 0))
+        # Rebuild the screen around each dynamic object: sky, then every
+        # polygon touching it in painter's order, drawn unclipped on a
+        # scratch surface (clipped lines rasterize differently) and copied
+        dyn = render_list[n_static:]
+        dyn_bounds = entry_bounds(dyn)
+        boxes = {}
+        for j, entry in enumerate(dyn):
+            obj = dyn_object[entry[1] - static_mesh.face_count]
+            x0, y0, x1, y1 = dyn_bounds[:, j].tolist()
+            box = pygame.Rect(x0 - 1, y0 - 1, x1 - x0 + 3, y1 - y0 + 3)
+            boxes[obj] = boxes[obj].union(box) if obj in boxes else box
+        rects = [r for r in merge_rects(r.clip(screen.get_rect()) for r in boxes.values()) if r.w and r.h]
+        if rects:
+            bounds = np.concatenate((static_layer.bounds, dyn_bounds), axis=1)
+            touch = [(bounds[0] < r.right) & (bounds[2] >= r.left) &
+                     (bounds[1] < r.bottom) & (bounds[3] >= r.top) for r in rects]
+            subset = [render_list[i] for i in np.flatnonzero(np.logical_or.reduce(touch)).tolist()]
+            scratch = static_layer.scratch
+            scratch.fill(world.sky_color)
+            if use_bsp:
+                order = order_of(subset)
+            else:
+                order = static_layer.depth_order(subset)
+            draw_ordered(scratch, subset, order, static_mesh, clipped, bsp)
+            for r in rects:
+                screen.blit(scratch, r, r)
+    t4 = time.perf_counter()
+
+    render_timings["world"]   = t1 - t0
+    render_timings["dynamic"] = t2 - t1
+    render_timings["sort"]    = t3 - t2
+    render_timings["draw"]    = t4 - t3
+    render_timings["polys"]   = len(render_list)
+
 
 # -------------------------------------------------
 # HUD
 # -------------------------------------------------
+class TextCache:
+    """Rendered text surfaces per named slot, re-rendered only on change."""
+    def __init__(self):
+        self.slots = {}
+
+    def render(self, slot, font, text, color):
+        key = (font, text, color)
+        hit = self.slots.get(slot)
+        if hit is None or hit[0] != key:
+            hit = self.slots[slot] = (key, font.render(text, True, color))
+        return hit[1]
+
+hud_text = TextCache()
+
 def draw_hud(screen, mario, world_name):
+    t0 = time.perf_counter()
     # Background bar
     pygame.draw.rect(screen, (0, 0, 0, 128), (0, 0, WIDTH, 45))
     pygame.draw.rect(screen, (0, 0, 0), (0, 44, WIDTH, 2))
 
     # Stars
-    star_txt = star_font.render(f"★{mario.stars_collected}", True, STAR_YELLOW)
+    star_txt = hud_text.render("stars", fonts.star, f"★{mario.stars_collected}", STAR_YELLOW)
     screen.blit(star_txt, (15, 2))
 
     # Coins
-    coin_txt = hud_font.render(f"×{mario.coins:03d}", True, YELLOW)
+    coin_txt = hud_text.render("coins", fonts.hud, f"×{mario.coins:03d}", YELLOW)
     screen.blit(coin_txt, (120, 14))
 
     # Lives
-    life_txt = hud_font.render(f"♥{mario.lives}", True, MARIO_RED)
+    life_txt = hud_text.render("lives", fonts.hud, f"♥{mario.lives}", MARIO_RED)
     screen.blit(life_txt, (220, 14))
 
     # Level name
-    name_txt = hud_font.render(world_name, True, WHITE)
+    name_txt = hud_text.render("name", fonts.hud, world_name, WHITE)
     screen.blit(name_txt, (WIDTH - name_txt.get_width() - 15, 14))
 
     # Controls (bottom)
-    ctrl = small_font.render("WASD/ARROWS: Move | SPACE: Jump | Q/E: Camera | ESC: Level Select", True, WHITE)
+    ctrl = hud_text.render("controls", fonts.small,
+                           "WASD/ARROWS: Move | SPACE: Jump | Q/E: Camera | ESC: Level Select", WHITE)
     screen.blit(ctrl, (WIDTH//2 - ctrl.get_width()//2, HEIGHT - 22))
+    render_timings["hud"] = time.perf_counter() - t0
+
+perf_text = TextCache()
+
+def draw_perf_overlay(screen, frame_ms, *extra):
+    """F3 overlay: frame time and the per-stage timings of the last frame."""
+    stages = "  ".join(f"{k} {v * 1000:.2f}" for k, v in render_timings.items()
+                       if k not in ("polys", "hud"))
+    lines = [
+        f"frame {frame_ms:.1f} ms  polys {render_timings.get('polys', 0)}  "
+        f"{render_options['backend']} (F2)  outline {render_options['outline']} (F4)",
+        stages,
+        f"hud {render_timings.get('hud', 0.0) * 1000:.3f} ms",
+        *extra,
+    ]
+    y = 52
+    for i, line in enumerate(lines):
+        txt = perf_text.render(i, fonts.small, line, WHITE)
+        pygame.draw.rect(screen, (0, 0, 0), (8, y, txt.get_width() + 6, txt.get_height()))
+        screen.blit(txt, (11, y))
+        y += txt.get_height() + 2
 
 
 # -------------------------------------------------
 # MENU SCENE
 # -------------------------------------------------
+class StaticScene:
+    """Base for menu screens that only change on input or a timer.
+
+    Subclasses implement view_state(), a tuple of everything the picture
+    depends on, and compose(surface), which paints that picture. draw()
+    recomposes the cached frame only when view_state() changes and returns
+    whether the screen was touched, so the main loop can skip the flip and
+    drop to IDLE_FPS while nothing happens.
+    """
+    def __init__(self):
+        self.frame = pygame.Surface((WIDTH, HEIGHT))
+        self.composed = None   # view_state() the cached frame shows
+        self.shown = False     # cached frame is on screen
+
+    def view_state(self):
+        return ()
+
+    def compose(self, surface):
+        pass
+
+    def invalidate(self):
+        """Force the next draw to blit, e.g. after the window was exposed."""
+        self.shown = False
+
+    def draw(self, screen):
+        state = self.view_state()
+        if state != self.composed:
+            self.compose(self.frame)
+            self.composed = state
+            self.shown = False
+        if self.shown:
+            return False
+        screen.blit(self.frame, (0, 0))
+        self.shown = True
+        return True
+
 class MenuScene:
+    """The title screen. Its cube spins by elapsed time, so once nobody has
+    pressed a key for TITLE_IDLE_MS the loop can drop to IDLE_FPS and the
+    animation only gets choppier, not slower."""
     def __init__(self):
-        self.ticks = 0
+        self.ticks = 0.0       # animation time in FPS ticks
         self.yaw = 0.0
+        self.text = TextCache()
+        self.wake()
 
-    def update(self):
-        self.ticks += 1
-        self.yaw += 0.03
+    def wake(self):
+        """Note input (or arriving at the title) to animate at full rate again."""
+        self.last_input = pygame.time.get_ticks()
+
+    def resting(self):
+        return pygame.time.get_ticks() - self.last_input > TITLE_IDLE_MS
+
+    def update(self, dt=SIM_STEP_MS):
+        steps = min(dt, MAX_FRAME_MS) / SIM_STEP_MS
+        self.ticks += steps
+        self.yaw += 0.03 * steps
 
     def draw(self, screen):
+        """The title animates every frame; only its text surfaces are cached."""
         screen.fill(NES_BLUE)
         # Spinning cube
         cx, cy = WIDTH // 2, HEIGHT // 2 + 50
@@ -1437,27 +3500,29 @@ class MenuScene:
             pygame.draw.polygon(screen, BLACK, poly, 2)
 
         # Title
-        shadow = title_font.render("ULTRA MARIO 3D BROS", True, BLACK)
-        title  = title_font.render("ULTRA MARIO 3D BROS", True, YELLOW)
+        shadow = self.text.render("shadow", fonts.title, "ULTRA MARIO 3D BROS", BLACK)
+        title  = self.text.render("title", fonts.title, "ULTRA MARIO 3D BROS", YELLOW)
         tr = title.get_rect(center=(WIDTH // 2, 130))
         screen.blit(shadow, (tr.x + 4, tr.y + 4))
         screen.blit(title, tr)
 
         # Subtitle
-        sub = menu_font.render("~ Complete 64 Edition ~", True, WHITE)
+        sub = self.text.render("sub", fonts.menu, "~ Complete 64 Edition ~", WHITE)
         screen.blit(sub, sub.get_rect(center=(WIDTH // 2, 195)))
 
         # Prompt
-        if (self.ticks // 30) % 2 == 0:
-            prompt = menu_font.render("PRESS SPACE TO START", True, WHITE)
+        if int(self.ticks // 30) % 2 == 0:
+            prompt = self.text.render("prompt", fonts.menu, "PRESS SPACE TO START", WHITE)
             screen.blit(prompt, prompt.get_rect(center=(WIDTH // 2, HEIGHT - 80)))
+        return True
 
 
 # -------------------------------------------------
 # LETTER SCENE
 # -------------------------------------------------
-class LetterScene:
+class LetterScene(StaticScene):
     def __init__(self):
+        super().__init__()
         self.lines = [
             "Dear Mario,",
             "",
@@ -1468,12 +3533,18 @@ class LetterScene:
             "Princess Toadstool",
             "  ~ Peach"
         ]
-        self.timer = 0
+        self.started = pygame.time.get_ticks()
 
     def update(self):
-        self.timer += 1
+        pass
 
-    def draw(self, screen):
+    def prompt_visible(self):
+        return pygame.time.get_ticks() - self.started > 1000
+
+    def view_state(self):
+        return (self.prompt_visible(),)
+
+    def compose(self, screen):
         screen.fill(BLACK)
         paper = pygame.Rect(0, 0, 450, 400)
         paper.center = SCREEN_CENTER
@@ -1482,28 +3553,30 @@ class LetterScene:
 
         y = paper.top + 50
         for line in self.lines:
-            txt = letter_font.render(line, True, INK_COLOR)
+            txt = fonts.letter.render(line, True, INK_COLOR)
             screen.blit(txt, txt.get_rect(center=(WIDTH // 2, y)))
             y += 40
 
-        if self.timer > 60:
-            prompt = hud_font.render("Press SPACE to Continue", True, WHITE)
+        if self.prompt_visible():
+            prompt = fonts.hud.render("Press SPACE to Continue", True, WHITE)
             screen.blit(prompt, (WIDTH - 280, HEIGHT - 40))
 
 
 # -------------------------------------------------
 # LEVEL SELECT SCENE
 # -------------------------------------------------
-class LevelSelectScene:
+class LevelSelectScene(StaticScene):
     def __init__(self, total_stars=0):
+        super().__init__()
         self.cursor = 0
         self.scroll = 0
         self.total_stars = total_stars
         self.visible_count = 8
+        self.loading = None    # course index confirmed while still building
 
     def update(self, events):
         for event in events:
-            if event.type == pygame.KEYDOWN:
+            if event.type == pygame.KEYDOWN and self.loading is None:
                 if event.key in (pygame.K_UP, pygame.K_w):
                     self.cursor = max(0, self.cursor - 1)
                 elif event.key in (pygame.K_DOWN, pygame.K_s):
@@ -1517,15 +3590,19 @@ class LevelSelectScene:
             self.scroll = self.cursor - self.visible_count + 1
         return None
 
-    def draw(self, screen):
+    def view_state(self):
+        spinner = pygame.time.get_ticks() // 80 % 8 if self.loading is not None else None
+        return (self.cursor, self.scroll, self.total_stars, self.loading, spinner)
+
+    def compose(self, screen):
         screen.fill((20, 15, 40))
 
         # Title
-        title = title_font.render("SELECT COURSE", True, STAR_YELLOW)
+        title = fonts.title.render("SELECT COURSE", True, STAR_YELLOW)
         screen.blit(title, title.get_rect(center=(WIDTH // 2, 55)))
 
         # Star count
-        star_txt = menu_font.render(f"Total Stars: ★ {self.total_stars}", True, YELLOW)
+        star_txt = fonts.menu.render(f"Total Stars: ★ {self.total_stars}", True, YELLOW)
         screen.blit(star_txt, star_txt.get_rect(center=(WIDTH // 2, 105)))
 
         # Course list
@@ -1542,40 +3619,76 @@ class LevelSelectScene:
             pygame.draw.rect(screen, color, (80, y + 4, 30, 30))
             pygame.draw.rect(screen, WHITE, (80, y + 4, 30, 30), 1)
             # Label
-            lbl = small_font.render(label, True, (180, 180, 180))
+            lbl = fonts.small.render(label, True, (180, 180, 180))
             screen.blit(lbl, (125, y + 2))
             # Name
-            n = select_font.render(name, True, WHITE if i == self.cursor else (200, 200, 200))
+            n = fonts.select.render(name, True, WHITE if i == self.cursor else (200, 200, 200))
             screen.blit(n, (125, y + 18))
 
         # Scroll indicators
         if self.scroll > 0:
-            arr = menu_font.render("▲", True, WHITE)
+            arr = fonts.menu.render("▲", True, WHITE)
             screen.blit(arr, arr.get_rect(center=(WIDTH // 2, y_start - 15)))
         if self.scroll + self.visible_count < len(COURSE_LIST):
-            arr = menu_font.render("▼", True, WHITE)
+            arr = fonts.menu.render("▼", True, WHITE)
             screen.blit(arr, arr.get_rect(center=(WIDTH // 2, y_start + self.visible_count * row_h + 5)))
 
         # Controls
-        ctrl = small_font.render("UP/DOWN: Navigate | SPACE/ENTER: Select | ESC: Back to Menu", True, (150, 150, 150))
+        ctrl = fonts.small.render("UP/DOWN: Navigate | SPACE/ENTER: Select | ESC: Back to Menu", True, (150, 150, 150))
         screen.blit(ctrl, ctrl.get_rect(center=(WIDTH // 2, HEIGHT - 20)))
 
+        # Loading box while a confirmed course finishes building
+        if self.loading is not None:
+            box = pygame.Rect(0, 0, 360, 110)
+            box.center = SCREEN_CENTER
+            pygame.draw.rect(screen, (10, 8, 25), box)
+            pygame.draw.rect(screen, STAR_YELLOW, box, 2)
+            txt = fonts.select.render(f"Loading {COURSE_LIST[self.loading][0]}...", True, WHITE)
+            screen.blit(txt, txt.get_rect(center=(box.centerx, box.top + 30)))
+            phase = self.view_state()[4]
+            for i in range(8):
+                a = 2 * math.pi * i / 8
+                col = STAR_YELLOW if i == phase else (90, 80, 40)
+                pygame.draw.circle(screen, col, (int(box.centerx + math.cos(a) * 18),
+                                                 int(box.bottom - 32 + math.sin(a) * 18)), 4)
+
 
 # -------------------------------------------------
 # STAR GET SCENE
 # -------------------------------------------------
 class StarGetScene:
-    def __init__(self):
+    """Star burst over a frozen snapshot of the course.
+
+    Nothing in the world moves during the sequence, so the last course frame
+    is captured once instead of re-rendered. The fade overlay surface is
+    shared by every instance, and once the fade tops out the darkened
+    snapshot is baked so each frame is one blit plus the animated burst.
+    """
+    FADE_MAX = 180
+    _overlay = None
+
+    def __init__(self, background):
         self.timer = 0
+        self.background = background
+        self.faded = None
+        self.text = TextCache()
+        if StarGetScene._overlay is None:
+            StarGetScene._overlay = pygame.Surface((WIDTH, HEIGHT))
+            StarGetScene._overlay.fill(BLACK)
 
     def update(self):
         self.timer += 1
 
     def draw(self, screen, total_stars):
-        overlay = pygame.Surface((WIDTH, HEIGHT))
-        overlay.fill(BLACK)
-        overlay.set_alpha(min(self.timer * 4, 180))
-        screen.blit(overlay, (0, 0))
+        alpha = min(self.timer * 4, self.FADE_MAX)
+        if self.faded is not None:
+            screen.blit(self.faded, (0, 0))
+        else:
+            screen.blit(self.background, (0, 0))
+            self._overlay.set_alpha(alpha)
+            screen.blit(self._overlay, (0, 0))
+            if alpha == self.FADE_MAX:
+                self.faded = screen.copy()
 
         if self.timer > 20:
             # Star burst
@@ -1587,54 +3700,278 @@ class StarGetScene:
                 sy = HEIGHT // 2 - 30 + math.sin(a) * (star_size * 2 + 20) + bob
                 pygame.draw.circle(screen, STAR_YELLOW, (int(sx), int(sy)), max(3, star_size // 3))
 
-            txt = star_font.render("★ STAR GET! ★", True, STAR_YELLOW)
+            txt = self.text.render("title", fonts.star, "★ STAR GET! ★", STAR_YELLOW)
             screen.blit(txt, txt.get_rect(center=(WIDTH // 2, HEIGHT // 2 - 30)))
 
-            count = menu_font.render(f"Total: {total_stars}", True, WHITE)
+            count = self.text.render("count", fonts.menu, f"Total: {total_stars}", WHITE)
             screen.blit(count, count.get_rect(center=(WIDTH // 2, HEIGHT // 2 + 30)))
 
         if self.timer > 120:
-            prompt = small_font.render("Press SPACE to continue", True, WHITE)
+            prompt = self.text.render("prompt", fonts.small, "Press SPACE to continue", WHITE)
             screen.blit(prompt, prompt.get_rect(center=(WIDTH // 2, HEIGHT // 2 + 80)))
 
 
+# -------------------------------------------------
+# BENCHMARK
+# -------------------------------------------------
+def camera_script(world, frames):
+    """Yield (x, y, z, yaw) poses: an orbit of the course, then a fly-through.
+
+    The first half of the frames orbits the origin looking inwards; the
+    second half flies from the spawn point across the course at head height.
+    """
+    orbit = frames // 2
+    for i in range(orbit):
+        a = 2 * math.pi * i / max(orbit, 1)
+        yield -math.sin(a) * 1200, 450, -math.cos(a) * 1200, a
+    sx, sz = world.spawn
+    fly = frames - orbit
+    for i in range(fly):
+        t = i / max(fly - 1, 1)
+        x = sx
+        z = sz - 600 + 1800 * t
+        yield x, 250, z, math.sin(t * math.pi) * 0.6
+
+def benchmark_course(screen, WorldClass, frames=240):
+    """Time construction, compilation, a cached load and a scripted render."""
+    t0 = time.perf_counter()
+    world = WorldClass()
+    t1 = time.perf_counter()
+    world.compile()
+    world.bsp
+    t2 = time.perf_counter()
+    load_course(WorldClass)                 # make sure the cache file exists
+    t3 = time.perf_counter()
+    load_course(WorldClass)
+    cached_ms = (time.perf_counter() - t3) * 1000
+    mario = Mario(*world.spawn)
+    cam = Camera(mario)
+    frame_ms = []
+    stages = {}
+    polys = 0
+    for cam.x, cam.y, cam.z, cam.yaw in camera_script(world, frames):
+        for item in world.stars + world.coins:
+            item.update()
+        start = time.perf_counter()
+        render_world(screen, world, mario, cam)
+        frame_ms.append((time.perf_counter() - start) * 1000)
+        for stage, secs in render_timings.items():
+            if stage == "polys":
+                polys += secs
+            else:
+                stages[stage] = stages.get(stage, 0.0) + secs * 1000
+    p50, p95, p99 = np.percentile(frame_ms, [50, 95, 99]).tolist()
+    # Camera at rest on the last pose while the collectibles keep spinning
+    rest_ms = []
+    hits = static_layer.hits
+    for _ in range(max(frames // 4, 2)):
+        for item in world.stars + world.coins:
+            item.update()
+        start = time.perf_counter()
+        render_world(screen, world, mario, cam)
+        rest_ms.append((time.perf_counter() - start) * 1000)
+    return {
+        "course": world.name,
+        "build_ms": (t1 - t0) * 1000,
+        "compile_ms": (t2 - t1) * 1000,
+        "cached_load_ms": cached_ms,
+        "faces": world.mesh.face_count,
+        "raw_faces": world.compile_stats["faces_in"],
+        "optimize": world.compile_stats,
+        "frames": frames,
+        "mean_ms": sum(frame_ms) / len(frame_ms),
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+        "polys_per_frame": polys / frames,
+        "rest_p50_ms": float(np.percentile(rest_ms, 50)),
+        # Frames the DepthSorter sorted from scratch (camera cuts); 0 with the BSP
+        "full_sorts": world.depth_sorter.full_sorts,
+        "rest_layer_hits": static_layer.hits - hits,
+        "stage_ms": {k: v / frames for k, v in stages.items()},
+    }
+
+def run_benchmark(frames=240, json_path=None):
+    screen = init_display(headless=True)
+    results = [benchmark_course(screen, WorldClass, frames)
+               for _, WorldClass, _, _ in COURSE_LIST]
+    stage_names = list(results[0]["stage_ms"]) if results else []
+    header = (f"{'course':<22}{'build':>8}{'cached':>8}{'faces':>11}{'polys':>7}"
+              f"{'p50':>8}{'p95':>8}{'p99':>8}{'rest':>8}" + "".join(f"{s:>9}" for s in stage_names))
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['course']:<22}{r['build_ms']:>8.2f}{r['cached_load_ms']:>8.2f}{r['raw_faces']:>6}>{r['faces']:<4}{r['polys_per_frame']:>7.0f}"
+              f"{r['p50_ms']:>8.2f}{r['p95_ms']:>8.2f}{r['p99_ms']:>8.2f}{r['rest_p50_ms']:>8.2f}"
+              + "".join(f"{r['stage_ms'][s]:>9.3f}" for s in stage_names))
+    print(f"(all times in ms; rest is p50 with the camera held still; stage columns are per-frame means; backend {render_options['backend']}, "
+          f"outline {render_options['outline']})")
+    if not render_options["bsp"]:
+        print("depth sorter full sorts (camera cuts): " +
+              ", ".join(f"{r['course']} {r['full_sorts']}" for r in results))
+    report = {"frames_per_course": frames, "backend": render_options["backend"],
+              "outline": render_options["outline"], "courses": results}
+    if json_path == "-":
+        print(json.dumps(report, indent=2))
+    elif json_path:
+        with open(json_path, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+# -------------------------------------------------
+# SIMULATION
+# -------------------------------------------------
+def step_game(world, mario, cam, inp):
+    """Advance gameplay by one tick; no rendering.
+
+    Returns (result, stars) where result is Mario.update's ("death" or None)
+    and stars lists the stars picked up this tick.
+    """
+    mario.store_prev()
+    cam.store_prev()
+    result = mario.update(inp, cam.yaw, world.platform_grid)
+    cam.update(inp)
+    stars = world.star_index.check(mario)
+    world.coin_index.check(mario)
+    for star in world.stars:
+        star.update()
+    for coin in world.coins:
+        coin.update()
+    return result, stars
+
+def state_digest(world, mario):
+    """Stable fingerprint of the gameplay state, to compare runs bit for bit."""
+    state = (mario.x, mario.y, mario.z, mario.vx, mario.vy, mario.vz, mario.yaw,
+             mario.lives, mario.coins, mario.stars_collected,
+             [s.collected for s in world.stars], [c.collected for c in world.coins])
+    return hashlib.sha1(repr(state).encode()).hexdigest()[:16]
+
+def run_simulation(WorldClass, inputs, collected_stars=None):
+    """Step one course through an input stream as fast as possible.
+
+    collected_stars (one flag per star) marks stars already taken on
+    earlier visits, as in a recording made on a cached course.
+    """
+    world = WorldClass()
+    world.begin_visit(collected_stars)
+    mario = Mario(*world.spawn)
+    cam = Camera(mario)
+    deaths = 0
+    start = time.perf_counter()
+    for inp in inputs:
+        result, _ = step_game(world, mario, cam, inp)
+        if result == "death":
+            deaths += 1
+            if mario.lives <= 0:
+                break
+            mario.respawn(*world.spawn)
+    secs = time.perf_counter() - start
+    return {
+        "course": world.name,
+        "ticks": len(inputs),
+        "ticks_per_sec": len(inputs) / secs if secs else float("inf"),
+        "stars": mario.stars_collected,
+        "coins": mario.coins,
+        "deaths": deaths,
+        "digest": state_digest(world, mario),
+    }
+
+def run_simulation_suite(ticks=3600, replay_path=None, json_path=None):
+    if replay_path:
+        replay = InputReplay.load(replay_path)
+        runs = [(COURSE_LIST[replay.course_index][1], replay.ticks, replay.collected_stars)]
+    else:
+        inputs = scripted_inputs(ticks)
+        runs = [(WorldClass, inputs, None) for _, WorldClass, _, _ in COURSE_LIST]
+    results = [run_simulation(*run) for run in runs]
+    print(f"{'course':<22}{'ticks':>7}{'ticks/s':>10}{'stars':>6}{'coins':>6}{'deaths':>7}  digest")
+    for r in results:
+        print(f"{r['course']:<22}{r['ticks']:>7}{r['ticks_per_sec']:>10.0f}"
+              f"{r['stars']:>6}{r['coins']:>6}{r['deaths']:>7}  {r['digest']}")
+    if json_path == "-":
+        print(json.dumps(results, indent=2))
+    elif json_path:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
 # -------------------------------------------------
 # MAIN GAME LOOP
 # -------------------------------------------------
-def main():
+def startup_report(init_s, first_frame_s):
+    total = time.perf_counter() - _IMPORT_T0
+    print(f"import       {IMPORT_SECONDS * 1000:8.1f} ms")
+    print(f"init         {init_s * 1000:8.1f} ms")
+    print(f"first frame  {first_frame_s * 1000:8.1f} ms")
+    print(f"total        {total * 1000:8.1f} ms  (module import to first flip)")
+    print(f"fonts loaded {len(fonts.loaded())}/{len(FONT_SPECS)}: {', '.join(fonts.loaded())}")
+
+def main(record_path=None, report_startup=False, course_cache_mb=32):
+    t0 = time.perf_counter()
+    screen = init_display()
+    clock = pygame.time.Clock()
+    init_s = time.perf_counter() - t0
+    first_frame = True
+
     state       = STATE_MENU
     menu_scene  = MenuScene()
     letter_scene = LetterScene()
     level_sel   = LevelSelectScene()
-    star_scene  = StarGetScene()
+    star_scene  = None
 
     mario       = None
     cam         = None
     world       = None
     total_stars = 0
+    recorder    = None
+    course_cache = CourseCache(course_cache_mb * 1024 * 1024)
+    prebuilder  = CoursePrebuilder(cache=course_cache)
+    accumulator = 0.0   # unsimulated ms carried between frames
+    show_perf   = False
+    idle        = False     # last frame drew nothing new, or the title is at rest
 
     running = True
     while running:
-        dt = clock.tick(FPS)
+        if state == STATE_PLAYING:
+            dt = clock.tick(MAX_RENDER_FPS)
+        else:
+            dt = clock.tick(IDLE_FPS if idle else FPS)
         keys = pygame.key.get_pressed()
         events = pygame.event.get()
 
         for event in events:
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                show_perf = not show_perf
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F2:
+                i = RENDER_BACKENDS.index(render_options["backend"])
+                render_options["backend"] = RENDER_BACKENDS[(i + 1) % len(RENDER_BACKENDS)]
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                i = OUTLINE_MODES.index(render_options["outline"])
+                render_options["outline"] = OUTLINE_MODES[(i + 1) % len(OUTLINE_MODES)]
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                letter_scene.invalidate()
+                level_sel.invalidate()
+
+        drew = True
 
         # ---- STATE MACHINE ----
         if state == STATE_MENU:
-            menu_scene.update()
+            menu_scene.update(dt)
             menu_scene.draw(screen)
             for event in events:
+                if event.type == pygame.KEYDOWN:
+                    menu_scene.wake()
                 if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
                     letter_scene = LetterScene()
                     state = STATE_LETTER
 
         elif state == STATE_LETTER:
             letter_scene.update()
-            letter_scene.draw(screen)
+            drew = letter_scene.draw(screen)
             for event in events:
                 if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
                     level_sel = LevelSelectScene(total_stars)
@@ -1643,65 +3980,148 @@ def main():
         elif state == STATE_LEVEL_SEL:
             level_sel.total_stars = total_stars
             choice = level_sel.update(events)
-            level_sel.draw(screen)
+            built = None
             if choice is not None:
-                _, WorldClass, _, _ = COURSE_LIST[choice]
-                world = WorldClass()
+                # Usually still cached from last time, or already built
+                # while the cursor rested on it
+                level_sel.loading = choice
+                built = course_cache.get(choice)
+                if built is None:
+                    prebuilder.request(choice)
+            elif level_sel.loading is None:
+                prebuilder.hover(level_sel.cursor, pygame.time.get_ticks())
+            if built is None and level_sel.loading is not None:
+                built = prebuilder.take(level_sel.loading)
+                if built is not None:
+                    course_cache.put(level_sel.loading, built)
+            if built is not None:
+                choice, level_sel.loading = level_sel.loading, None
+                world = built
+                world.begin_visit()
+                if record_path:
+                    recorder = InputRecorder(choice, world.collected_stars())
                 mario = Mario(*world.spawn)
                 cam = Camera(mario)
+                accumulator = 0.0
                 state = STATE_PLAYING
+                drew = False
+            else:
+                drew = level_sel.draw(screen)
             for event in events:
                 if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                    level_sel.loading = None
+                    menu_scene.wake()
                     state = STATE_MENU
 
         elif state == STATE_PLAYING:
-            result = mario.update(keys, cam.yaw, world.platforms)
-            cam.update(keys)
-
-            # Check star collection
+            # Fixed-step simulation: run as many FPS-rate ticks as real time
+            # owes, then render between the last two ticks.
+            inp = read_input(keys)
+            accumulator += min(dt, MAX_FRAME_MS)
             got_star = False
-            for star in world.stars:
-                if star.check(mario):
-                    total_stars += 1
+            while accumulator >= SIM_STEP_MS:
+                accumulator -= SIM_STEP_MS
+                if recorder:
+                    recorder.record(inp)
+                result, stars = step_game(world, mario, cam, inp)
+
+                # Check star collection
+                total_stars += len(stars)
+                if stars:
                     got_star = True
-            for coin in world.coins:
-                coin.check(mario)
+                    break
 
-            render_world(screen, world, mario, cam)
+                if result == "death":
+                    if mario.lives <= 0:
+                        static_layer.clear()
+                        menu_scene.wake()
+                        state = STATE_MENU
+                        total_stars = 0
+                        course_cache.reset_all()
+                        break
+                    mario.respawn(*world.spawn)
+
+            alpha = min(accumulator / SIM_STEP_MS, 1.0)
+            render_world(screen, world, mario, cam, alpha)
             draw_hud(screen, mario, world.name)
 
             if got_star:
-                star_scene = StarGetScene()
+                star_scene = StarGetScene(screen.copy())
                 state = STATE_STAR_GET
 
-            if result == "death":
-                if mario.lives <= 0:
-                    state = STATE_MENU
-                    total_stars = 0
-                else:
-                    mario.respawn(*world.spawn)
+            if show_perf:
+                draw_perf_overlay(screen, dt, *course_cache.report())
 
             for event in events:
                 if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                    static_layer.clear()
                     level_sel = LevelSelectScene(total_stars)
                     state = STATE_LEVEL_SEL
 
         elif state == STATE_STAR_GET:
-            # Keep rendering world behind
-            render_world(screen, world, mario, cam)
-            draw_hud(screen, mario, world.name)
+            # The world behind is the snapshot taken when the star was grabbed
             star_scene.update()
             star_scene.draw(screen, total_stars)
             for event in events:
                 if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
                     if star_scene.timer > 60:
+                        accumulator = 0.0
                         state = STATE_PLAYING
 
-        pygame.display.flip()
-
+        if drew:
+            pygame.display.flip()
+            if first_frame:
+                first_frame = False
+                if report_startup:
+                    startup_report(init_s, time.perf_counter() - t0 - init_s)
+        idle = not drew or (state == STATE_MENU and menu_scene.resting())
+
+    if recorder:
+        recorder.save(record_path)
+    prebuilder.shutdown()
     pygame.quit()
     sys.exit()
 
 
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_T0
+
+
 if __name__ == "__main__":
-    main()
+    import argparse
+    parser = argparse.ArgumentParser(description="Ultra Mario 3D Bros")
+    parser.add_argument("--bench", action="store_true",
+                        help="run the headless render benchmark over every course")
+    parser.add_argument("--frames", type=int, default=240,
+                        help="frames rendered per course in --bench")
+    parser.add_argument("--sim", action="store_true",
+                        help="run gameplay without rendering and report ticks per second")
+    parser.add_argument("--ticks", type=int, default=3600,
+                        help="scripted ticks per course in --sim")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="in --sim, step a recorded session instead of scripted input")
+    parser.add_argument("--record", metavar="PATH",
+                        help="record the last course played to PATH for --replay")
+    parser.add_argument("--course-cache-mb", type=int, default=32,
+                        help="memory budget for keeping played courses built")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print import, init and first-frame times once the title is up")
+    parser.add_argument("--backend", choices=RENDER_BACKENDS, default="polygon",
+                        help="renderer to start with (F2 switches in game)")
+    parser.add_argument("--outline", choices=OUTLINE_MODES, default="faces",
+                        help="polygon outlines to start with (F4 switches in game)")
+    parser.add_argument("--no-bsp", action="store_true",
+                        help="depth-sort the course every frame instead of walking its BSP")
+    parser.add_argument("--json", metavar="PATH",
+                        help="also write the --bench/--sim report as JSON ('-' for stdout)")
+    args = parser.parse_args()
+    render_options["bsp"] = not args.no_bsp
+    render_options["backend"] = args.backend
+    render_options["outline"] = args.outline
+    if args.bench:
+        run_benchmark(args.frames, args.json)
+        pygame.quit()
+    elif args.sim:
+        run_simulation_suite(args.ticks, args.replay, args.json)
+        pygame.quit()
+    else:
+        main(args.record, args.startup_report, args.course_cache_mb)